@@ -2,12 +2,13 @@ import json
 from typing import List, Dict, Any
 from .base_agent import BaseAgent, AgentMessage
 from models.search_result import SearchResult
-from tools.sqlite_tool import SQLiteTool
+from tools.async_sqlite import AsyncSQLiteTool
+from config.settings import settings
 
 class TemporalAgent(BaseAgent):
     def __init__(self):
         super().__init__("TemporalAgent")
-        self.sqlite_tool = SQLiteTool()
+        self.sqlite_tool = AsyncSQLiteTool()
     
     def get_available_functions(self) -> List[Dict]:
         return [
@@ -85,7 +86,7 @@ class TemporalAgent(BaseAgent):
         if not video_id:
             return []
         
-        results = self.sqlite_tool.get_keyframes_in_timerange(video_id, start_time, end_time)
+        results = await self.sqlite_tool.get_keyframes_in_timerange(video_id, start_time, end_time)
         
         for result in results:
             result['temporal_score'] = 1.0
@@ -114,7 +115,10 @@ class TemporalAgent(BaseAgent):
         if duration_filter.get('sort_by_duration'):
             query += " ORDER BY length DESC"
         
-        results = self.sqlite_tool.execute_query(query, tuple(params))
+        query += " LIMIT ?"
+        params.append(settings.SEARCH_TOP_K)
+        
+        results = await self.sqlite_tool.execute_query(query, tuple(params))
         
         for result in results:
             result['temporal_score'] = 1.0
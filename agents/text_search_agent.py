@@ -1,9 +1,12 @@
 import json
+import numpy as np
 from typing import List, Dict, Any
 from .base_agent import BaseAgent, AgentMessage
 from models.search_result import SearchResult
+from tools.async_sqlite import AsyncSQLiteTool
 from tools.sqlite_tool import SQLiteTool
 from tools.qdrant_tool import QdrantTool
+from tools.object_index import get_object_index
 from config.settings import settings
 from utils.result_ranker import ResultRanker
 
@@ -11,7 +14,18 @@ class TextSearchAgent(BaseAgent):
     def __init__(self):
         super().__init__("TextSearchAgent")
         self.qdrant_tool = QdrantTool(settings.QDRANT_KEYWORD_COLLECTION_NAME)
-        self.sqlite_tool = SQLiteTool()
+        self.sqlite_tool = AsyncSQLiteTool()
+        self.object_index = self._load_object_index()
+    
+    def _load_object_index(self):
+        """Build the object inverted index at startup; None falls back to SQL"""
+        if not settings.OBJECT_INDEX_ENABLED:
+            return None
+        try:
+            return get_object_index()
+        except Exception as e:
+            self.log(f"Object index unavailable, using SQL object search: {e}")
+            return None
     
     def get_available_functions(self) -> List[Dict]:
         return [
@@ -52,14 +66,18 @@ class TextSearchAgent(BaseAgent):
             strategy = await self._analyze_search_strategy(query, context)
             self.log(f"Search strategy: {strategy['search_strategy']}")
             
-            # Step 2: Execute search based on strategy
-            results = await self._execute_search(strategy)
+            # Step 2: Execute search based on strategy, top-k per source pushed into SQL;
+            # cursors from a previous response fetch the next page
+            page = {'after': (context or {}).get('page_cursors', {}), 'next': {}}
+            results = await self._execute_search(strategy, page)
             
             # Step 3: Rank and filter results
             ranked_results = self._rank_results(results, strategy)
             
             # Step 4: Convert to SearchResult objects
-            search_results = self._create_search_results(ranked_results[:50], 'score', 'explanation')
+            search_results = self._create_search_results(
+                ranked_results[:settings.SEARCH_TOP_K], 'score', 'explanation'
+            )
             search_results = ResultRanker.diversity_ranking(search_results)
             
             confidence = self._calculate_confidence(search_results, strategy)
@@ -72,6 +90,7 @@ class TextSearchAgent(BaseAgent):
                 metadata={
                     'strategy': strategy,
                     'total_found': len(results),
+                    'next_page_cursors': page['next'],
                     'returned': len(search_results)
                 },
                 explanation=f"Tìm thấy {len(search_results)} kết quả bằng {strategy['search_strategy']}",
@@ -94,51 +113,75 @@ class TextSearchAgent(BaseAgent):
         }
         return await self._analyze_strategy(query, context, 'search_terms', fallback_strategy)
     
-    async def _execute_search(self, strategy: Dict) -> List[Dict]:
+    async def _execute_search(self, strategy: Dict, page: Dict = None) -> List[Dict]:
         """Execute search based on strategy"""
+        page = page or {'after': {}, 'next': {}}
         all_results = []
         
         strategy_type = strategy['search_strategy']
         
         if strategy_type in ['METADATA_SEARCH', 'COMBINED_SEARCH']:
-            metadata_results = await self._search_metadata(strategy.get('metadata_search', {}))
+            metadata_results = await self._search_metadata(strategy.get('metadata_search', {}), page)
             all_results.extend(metadata_results)
         
         if strategy_type in ['OBJECT_SEARCH', 'COMBINED_SEARCH']:
-            object_results = await self._search_objects(strategy.get('object_search', {}))
+            object_results = await self._search_objects(strategy.get('object_search', {}), page)
             all_results.extend(object_results)
         
         if strategy_type == 'AUTHOR_SEARCH':
-            author_results = await self._search_by_author(strategy.get('filters', {}))
+            author_results = await self._search_by_author(strategy.get('filters', {}), page)
             all_results.extend(author_results)
         
         return all_results
     
-    async def _search_metadata(self, metadata_config: Dict) -> List[Dict]:
+    def _next_cursor(self, page: Dict, source: str, results: List[Dict], order_columns: List[str]):
+        """Record the keyset cursor of source's next page; None when this page was not full"""
+        if len(results) < settings.SEARCH_TOP_K:
+            page['next'][source] = None
+        else:
+            page['next'][source] = SQLiteTool.next_cursor(results, order_columns)
+    
+    async def _search_metadata(self, metadata_config: Dict, page: Dict) -> List[Dict]:
         """Search in video metadata"""
-        results = []
         terms = metadata_config.get('terms', [])
         fields = metadata_config.get('fields', ['title', 'description', 'keywords'])
+        prefix = not metadata_config.get('exact_match', False)
         
-        for term in terms:
-            db_results = self.sqlite_tool.search_videos_by_text(term, fields)
-            for result in db_results:
-                result['result_type'] = 'video'
-                result['search_term'] = term
-                result['explanation'] = f"Tìm thấy '{term}' trong {', '.join(fields)}"
-                results.append(result)
+        # All terms in one statement, one row per video
+        results = await self.sqlite_tool.search_videos_by_terms(
+            list(terms), fields, prefix, limit=settings.SEARCH_TOP_K, after=page['after'].get('metadata')
+        )
+        self._next_cursor(page, 'metadata', results, SQLiteTool.VIDEO_ORDERINGS['relevance'])
+        for result in results:
+            result['result_type'] = 'video'
+            result['explanation'] = (
+                f"Tìm thấy '{', '.join(result['matched_terms'])}' trong {', '.join(result['matched_fields'])}"
+            )
         
         return results
     
-    async def _search_objects(self, object_config: Dict) -> List[Dict]:
+    async def _search_objects(self, object_config: Dict, page: Dict) -> List[Dict]:
         """Search by object detection"""
         object_names = object_config.get('object_names', [])
+        required_objects = object_config.get('required_objects', [])
+        object_counts = object_config.get('object_counts') or {}
         confidence_threshold = object_config.get('confidence_threshold', 0.5)
         
-        if not object_names:
+        if not object_names and not required_objects and not object_counts:
             return []
         
-        db_results = self.sqlite_tool.search_objects(object_names, confidence_threshold)
+        # The index holds detections from OBJECT_INDEX_MIN_CONFIDENCE up; lower thresholds go to SQL
+        if self.object_index is not None and self.object_index.supports(confidence_threshold):
+            return await self._search_object_index(object_names, required_objects, object_counts,
+                                                   confidence_threshold, page)
+        
+        if object_counts:
+            return await self._search_object_counts(object_counts, page)
+        
+        db_results = await self.sqlite_tool.search_objects(
+            object_names, confidence_threshold, limit=settings.SEARCH_TOP_K, after=page['after'].get('objects')
+        )
+        self._next_cursor(page, 'objects', db_results, SQLiteTool.OBJECT_ORDERINGS['confidence'])
         
         results = []
         for result in db_results:
@@ -148,13 +191,98 @@ class TextSearchAgent(BaseAgent):
         
         return results
     
-    async def _search_by_author(self, filters: Dict) -> List[Dict]:
+    async def _search_object_counts(self, object_counts: Dict, page: Dict) -> List[Dict]:
+        """Counting queries against keyframe_object_counts when the object index is off"""
+        results = await self.sqlite_tool.search_keyframes_by_counts(
+            object_counts, limit=settings.SEARCH_TOP_K, after=page['after'].get('object_counts')
+        )
+        self._next_cursor(page, 'object_counts', results, ['video_id', 'keyframe_id'])
+        for result in results:
+            result['result_type'] = 'keyframe'
+            result['explanation'] = "Có " + ', '.join(f"{n} {name}" for name, n in result['object_counts'].items())
+        return results
+    
+    async def _search_object_index(self, object_names: List[str], required_objects: List[str],
+                                   object_counts: Dict, confidence_threshold: float, page: Dict) -> List[Dict]:
+        """Keyframes with every required object (or any requested one when none is required)
+        and per-class counts matching object_counts"""
+        # Picks up a newly published database; a rebuild runs off the event loop
+        try:
+            self.object_index = await self.sqlite_tool.run_in_executor(get_object_index)
+        except Exception as e:
+            self.log(f"Object index refresh failed, keeping the loaded index: {e}")
+        # one snapshot for the whole request, even if a refresh swaps in a new one meanwhile
+        index = self.object_index.snapshot()
+        
+        required = list(dict.fromkeys(n.lower() for n in required_objects))
+        optional = [n for n in dict.fromkeys(n.lower() for n in object_names) if n not in required]
+        
+        counted = [n for n in dict.fromkeys(n.lower() for n in object_counts) if n not in required + optional]
+        
+        ordinals = None
+        if required:
+            ordinals = index.query(all_of=required, confidence_threshold=confidence_threshold)
+        elif optional:
+            ordinals = index.query(any_of=optional, confidence_threshold=confidence_threshold)
+        if object_counts:
+            matching_counts = index.count_query(object_counts)
+            ordinals = matching_counts if ordinals is None else np.intersect1d(ordinals, matching_counts,
+                                                                               assume_unique=True)
+        if ordinals is None or not len(ordinals):
+            return []
+        
+        # Optional objects only add to the score of keyframes that have the required ones
+        names = required + optional + counted
+        scores = np.stack([index.confidences(name, ordinals) for name in names])
+        present = scores >= confidence_threshold
+        object_count = present.sum(axis=0)
+        avg_confidence = np.where(present, scores, 0).sum(axis=0) / np.maximum(object_count, 1)
+        
+        # In-memory results page by position; the cursor is the next offset
+        offset = page['after'].get('object_index') or 0
+        order = np.lexsort((-avg_confidence, -object_count))[offset:offset + settings.SEARCH_TOP_K]
+        next_offset = offset + len(order)
+        page['next']['object_index'] = next_offset if next_offset < len(ordinals) else None
+        keys = index.keyframe_keys(ordinals[order])
+        keyframes = await self.sqlite_tool.get_keyframes(keys)
+        count_columns = {
+            name: index.object_counts(name, ordinals) for name in dict.fromkeys(n.lower() for n in object_counts)
+        }
+        
+        results = []
+        for position, key in zip(order, keys):
+            matched = [name for name, hit in zip(names, present[:, position]) if hit]
+            keyframe = keyframes.get(key, {})
+            counts = {name: int(column[position]) for name, column in count_columns.items()}
+            explanation = f"Chứa {', '.join(matched)} (confidence: {avg_confidence[position]:.2f})"
+            if counts:
+                explanation += "; số lượng: " + ', '.join(f"{n} {name}" for name, n in counts.items())
+            results.append({
+                'video_id': key[0],
+                'keyframe_id': key[1],
+                'object_name': ', '.join(matched),
+                'matched_objects': matched,
+                'avg_confidence': float(avg_confidence[position]),
+                'object_count': int(object_count[position]),
+                'object_counts': counts,
+                'pts_time': keyframe.get('pts_time'),
+                'frame_idx': keyframe.get('frame_idx'),
+                'result_type': 'keyframe',
+                'explanation': explanation
+            })
+        
+        return results
+    
+    async def _search_by_author(self, filters: Dict, page: Dict) -> List[Dict]:
         """Search by author"""
         author = filters.get('author')
         if not author:
             return []
         
-        results = self.sqlite_tool.search_videos_by_text(author, ['author'])
+        results = await self.sqlite_tool.search_videos_by_text(
+            author, ['author'], limit=settings.SEARCH_TOP_K, after=page['after'].get('author')
+        )
+        self._next_cursor(page, 'author', results, SQLiteTool.VIDEO_ORDERINGS['relevance'])
         for result in results:
             result['result_type'] = 'video'
             result['explanation'] = f"Video của tác giả {result['author']}"
@@ -170,23 +298,23 @@ class TextSearchAgent(BaseAgent):
             'object_confidence': 0.9
         })
         
+        field_weights = {
+            'title': weights.get('title_match', 1.0),
+            'keywords': weights.get('keyword_match', 0.8),
+            'description': weights.get('description_match', 0.6)
+        }
+        
         for result in results:
             score = 0.0
             
-            # Title match scoring
-            if result.get('search_term') and result.get('title'):
-                if result['search_term'].lower() in result['title'].lower():
-                    score += weights.get('title_match', 1.0)
+            # Metadata match scoring, once per video over all matched fields
+            for field in result.get('matched_fields', []):
+                score += field_weights.get(field, 0.0)
             
             # Object confidence scoring
             if result.get('avg_confidence'):
                 score += result['avg_confidence'] * weights.get('object_confidence', 0.9)
             
-            # Keyword match scoring
-            if result.get('search_term') and result.get('keywords'):
-                if result['search_term'].lower() in result['keywords'].lower():
-                    score += weights.get('keyword_match', 0.8)
-            
             result['score'] = score
         
         # Sort by score descending
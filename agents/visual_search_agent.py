@@ -1,17 +1,22 @@
 import json
-from typing import List, Dict, Any
+import time
+import asyncio
+from typing import List, Dict, Any, Tuple
 from .base_agent import BaseAgent, AgentMessage
 from models.search_result import SearchResult
 from tools.qdrant_tool import QdrantTool
-from tools.sqlite_tool import SQLiteTool
+from tools.shard_router import get_video_shards
+from tools.search_tuner import SearchParamTuner
+from tools.async_sqlite import AsyncSQLiteTool
 from config.settings import settings
 from utils.result_ranker import ResultRanker
 
 class VisualSearchAgent(BaseAgent):
     def __init__(self):
         super().__init__("VisualSearchAgent")
-        self.qdrant_tool = QdrantTool(settings.QDRANT_VIDEO_COLLECTION_NAME)
-        self.sqlite_tool = SQLiteTool()
+        self.qdrant_tool = QdrantTool(settings.QDRANT_VIDEO_COLLECTION_NAME, shards=get_video_shards(timeout=settings.QDRANT_SHARD_TIMEOUT))
+        self.sqlite_tool = AsyncSQLiteTool()
+        self.search_tuner = SearchParamTuner()
     
     def get_available_functions(self) -> List[Dict]:
         return [
@@ -49,16 +54,19 @@ class VisualSearchAgent(BaseAgent):
                 raise Exception("Failed to generate visual embedding")
             
             # Step 3: Execute visual search
-            visual_results = await self._execute_visual_search(query_embedding, strategy)
+            visual_results, search_stats = await self._execute_visual_search(query_embedding, strategy)
             
             # Step 4: Enrich with metadata
             enriched_results = await self._enrich_with_metadata(visual_results)
             
             # Step 5: Apply post-processing
-            final_results = self._post_process_results(enriched_results, strategy)
+            final_results = self._post_process_results(enriched_results, strategy, search_stats.get('grouped', False))
             
-            # Step 6: Convert to SearchResult objects
-            search_results = self._create_search_results(final_results[:50], 'similarity_score', 'explanation', 'keyframe')
+            # Step 6: Convert to SearchResult objects (video mode hits are already tagged 'video')
+            result_mode = strategy.get('search_params', {}).get('result_mode', 'keyframe')
+            for result in final_results:
+                result.setdefault('result_type', result_mode)
+            search_results = self._create_search_results(final_results[:50], 'similarity_score', 'explanation')
             search_results = ResultRanker.diversity_ranking(search_results)
             
             confidence = self._calculate_visual_confidence(search_results, strategy)
@@ -72,7 +80,9 @@ class VisualSearchAgent(BaseAgent):
                     'strategy': strategy,
                     'embedding_generated': len(query_embedding) > 0,
                     'total_found': len(visual_results),
-                    'returned': len(search_results)
+                    'returned': len(search_results),
+                    'search_params': search_stats.get('params'),
+                    'search_latency_ms': search_stats.get('latency_ms')
                 },
                 explanation=f"Tìm thấy {len(search_results)} keyframes tương tự visual",
                 success=True
@@ -93,7 +103,8 @@ class VisualSearchAgent(BaseAgent):
             "search_params": {
                 "similarity_threshold": 0.6,
                 "max_results": 100,
-                "diversity_filter": True
+                "diversity_filter": True,
+                "result_mode": "keyframe"
             },
             "explanation": "Fallback to simple text-to-visual search"
         }
@@ -127,43 +138,84 @@ class VisualSearchAgent(BaseAgent):
             return []
     
     async def _execute_visual_search(self, query_embedding: List[float], 
-                                   strategy: Dict) -> List[Dict]:
-        """Execute visual similarity search"""
+                                   strategy: Dict) -> Tuple[List[Dict], Dict]:
+        """Execute visual similarity search, returning results and the params/latency used"""
         try:
             search_params = strategy.get('search_params', {})
             metadata_filters = strategy.get('metadata_filters', {})
             
-            similarity_threshold = search_params.get('similarity_threshold', 0.7)
             max_results = search_params.get('max_results', 100)
             video_filter = metadata_filters.get('video_ids')
+            result_mode = search_params.get('result_mode', 'keyframe')
+            grouped = result_mode == 'video' or search_params.get('diversity_filter', False)
             
-            results = self.qdrant_tool.search_similar_keyframes(
-                query_vector=query_embedding,
-                limit=max_results,
-                similarity_threshold=0.05,
-                video_filter=video_filter
-            )
+            # Pick hnsw_ef/exact that fit the latency budget for this many candidates
+            candidate_count = settings.VISUAL_GROUP_LIMIT * settings.VISUAL_GROUP_SIZE if grouped else max_results
+            tuned = self.search_tuner.choose(candidate_count)
+            start_time = time.perf_counter()
             
-            return results
+            if grouped:
+                # Let Qdrant cap keyframes per video instead of over-fetching and dropping hits
+                groups = self.qdrant_tool.search_video_groups(
+                    query_vector=query_embedding,
+                    group_limit=settings.VISUAL_GROUP_LIMIT,
+                    group_size=settings.VISUAL_GROUP_SIZE,
+                    similarity_threshold=settings.VISUAL_SIMILARITY_THRESHOLD,
+                    video_filter=video_filter,
+                    hnsw_ef=tuned['hnsw_ef'],
+                    exact=tuned['exact']
+                )
+                results = self._flatten_groups(groups, result_mode)
+            else:
+                results = self.qdrant_tool.search_similar_keyframes(
+                    query_vector=query_embedding,
+                    limit=max_results,
+                    similarity_threshold=settings.VISUAL_SIMILARITY_THRESHOLD,
+                    video_filter=video_filter,
+                    hnsw_ef=tuned['hnsw_ef'],
+                    exact=tuned['exact']
+                )
+            
+            latency_ms = (time.perf_counter() - start_time) * 1000
+            self.search_tuner.record(tuned, latency_ms)
+            
+            return results, {'params': tuned, 'latency_ms': latency_ms, 'grouped': grouped}
             
         except Exception as e:
             self.log(f"Visual search execution failed: {e}")
-            return []
+            return [], {}
+    
+    def _flatten_groups(self, groups: List[Dict], result_mode: str) -> List[Dict]:
+        """Turn per-video groups into keyframe hits, or one hit per video in video mode"""
+        if result_mode == 'video':
+            results = []
+            for group in groups:
+                best_hit = group['keyframes'][0].copy()
+                best_hit['result_type'] = 'video'
+                best_hit['keyframes'] = group['keyframes']
+                results.append(best_hit)
+            return results
+        
+        return [hit for group in groups for hit in group['keyframes']]
     
     async def _enrich_with_metadata(self, visual_results: List[Dict]) -> List[Dict]:
         """Enrich visual results with metadata from SQLite"""
         enriched_results = []
         
+        # Two batched queries for all hits instead of two queries per hit, run concurrently
+        videos_metadata, objects_by_keyframe = await asyncio.gather(
+            self.sqlite_tool.get_videos_metadata(
+                [result['video_id'] for result in visual_results]
+            ),
+            self.sqlite_tool.get_objects_for_keyframes(
+                [(result['video_id'], result['keyframe_id']) for result in visual_results]
+            )
+        )
+        
         for result in visual_results:
             try:
-                # Get video metadata
-                video_metadata = self.sqlite_tool.get_video_metadata(result['video_id'])
-                
-                # Get keyframe objects
-                keyframe_objects = self.sqlite_tool.get_keyframe_objects(
-                    result['video_id'], 
-                    result['keyframe_id']
-                )
+                video_metadata = videos_metadata.get(result['video_id'])
+                keyframe_objects = objects_by_keyframe.get((result['video_id'], result['keyframe_id']), [])
                 
                 enriched_result = result.copy()
                 enriched_result['video_metadata'] = video_metadata
@@ -185,12 +237,12 @@ class VisualSearchAgent(BaseAgent):
         
         return enriched_results
     
-    def _post_process_results(self, results: List[Dict], strategy: Dict) -> List[Dict]:
+    def _post_process_results(self, results: List[Dict], strategy: Dict, grouped: bool = False) -> List[Dict]:
         """Post-process results based on strategy"""
         search_params = strategy.get('search_params', {})
         
-        # Apply diversity filter if requested
-        if search_params.get('diversity_filter', False):
+        # Apply diversity filter if requested; grouped searches are already capped per video
+        if search_params.get('diversity_filter', False) and not grouped:
             results = self._apply_diversity_filter(results)
         
         # Re-rank based on combined scores
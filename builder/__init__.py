@@ -1,14 +1,44 @@
 from .database_builder import (
     build_metadata_database, 
     build_keyframes_database, 
-    build_objects_database
+    build_objects_database,
+    build_database_indexes,
+    finalize_database,
+    verify_query_plans,
+    delete_videos,
+    normalize_raw_data
 )
-from .index_builder import build_clip_vector_store, build_keyword_vector_store
+from .index_builder import (
+    build_clip_vector_store,
+    build_keyword_vector_store,
+    publish_clip_vector_store,
+    publish_keyword_vector_store,
+    update_clip_vector_store,
+    update_keyword_vector_store
+)
+from .manifest import load_manifest, save_manifest, scan_sources, diff_manifests, BuildCheckpoint
+from .snapshot_builder import export_snapshot_bundle, restore_snapshot_bundle
 
 __all__ = [
     "build_metadata_database", 
     "build_keyframes_database", 
     "build_objects_database",
+    "build_database_indexes",
+    "finalize_database",
+    "verify_query_plans",
+    "delete_videos",
+    "normalize_raw_data",
     "build_clip_vector_store", 
-    "build_keyword_vector_store"
+    "build_keyword_vector_store",
+    "publish_clip_vector_store",
+    "publish_keyword_vector_store",
+    "update_clip_vector_store",
+    "update_keyword_vector_store",
+    "load_manifest",
+    "save_manifest",
+    "scan_sources",
+    "diff_manifests",
+    "BuildCheckpoint",
+    "export_snapshot_bundle",
+    "restore_snapshot_bundle"
 ]
\ No newline at end of file
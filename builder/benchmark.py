@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import time
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+from qdrant_client import QdrantClient
+from config.settings import settings
+from tools.shard_router import shard_collection_names
+from . import index_builder
+from .database_builder import (
+    build_metadata_database,
+    build_keyframes_database,
+    build_objects_database,
+    build_database_indexes,
+    finalize_database,
+    normalize_raw_data
+)
+from .synthetic import generate_synthetic_dataset
+
+BENCHMARK_STAGES = ["metadata", "normalize", "keyframes", "objects", "indexes", "finalize", "clip", "keywords"]
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident set size so far of this process and its finished workers, None if unknown"""
+    try:
+        import resource  # Unix only
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        # Windows: peak working set of this process only
+        peak = getattr(psutil.Process().memory_info(), "peak_wset", None)
+        return peak / 2**20 if peak is not None else None
+
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KB on Linux
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak * scale / 2**20
+
+@contextmanager
+def _override_settings(**values):
+    previous = {name: getattr(settings, name) for name in values}
+    for name, value in values.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(settings, name, value)
+
+@contextmanager
+def _in_memory_qdrant():
+    """Point the index builders at one in-process Qdrant instead of the server"""
+    memory_client = QdrantClient(":memory:")
+    previous = index_builder.client, index_builder.get_video_shards
+    index_builder.client = memory_client
+    index_builder.get_video_shards = lambda: [
+        (memory_client, name)
+        for name in shard_collection_names(settings.QDRANT_VIDEO_COLLECTION_NAME, settings.QDRANT_SHARD_COUNT)
+    ]
+    try:
+        yield memory_client
+    finally:
+        index_builder.client, index_builder.get_video_shards = previous
+
+def _point_count(client: QdrantClient, prefix: str) -> int:
+    return sum(
+        client.count(collection_name=c.name, exact=True).count
+        for c in client.get_collections().collections if c.name.startswith(prefix)
+    )
+
+def run_benchmark(output_dir=None, videos: int = 100, keyframes: int = 200, detections: int = 8,
+                  dim: int = 512, seed: int = 0, stages=None, data_dir=None) -> dict:
+    """Build every stage against a synthetic dataset and record its throughput.
+
+    Writes into a fresh directory (a temporary one unless output_dir is
+    given), with the vector stores in an in-memory Qdrant, so it never
+    touches the configured data or server. Pass data_dir to reuse a
+    dataset from generate_synthetic_dataset. The report is also saved as
+    benchmark.json in the output directory.
+    """
+    output_dir = Path(output_dir or tempfile.mkdtemp(prefix="builder-benchmark-"))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stages = stages or BENCHMARK_STAGES
+
+    if data_dir is None:
+        data_dir = output_dir / "raw_data"
+        dataset = generate_synthetic_dataset(data_dir, videos, keyframes, detections, dim, seed=seed)
+    else:
+        dataset = {"root": str(data_dir)}
+    data_dir = Path(data_dir)
+    db_path = output_dir / "benchmark.db"
+    if db_path.exists():
+        os.remove(db_path)
+
+    overrides = dict(
+        RAW_METADATA_DIR=data_dir / "media-info",
+        RAW_MAP_KEYFRAME_DIR=data_dir / "map-keyframes",
+        RAW_OBJECT_DIR=data_dir / "objects",
+        RAW_CLIPFEATURE_DIR=data_dir / "clip-features-32",
+        METADATA_KEYFRAME_OBJECT_DB_PATH=db_path,
+        COLUMNAR_STORE_DIR=output_dir / "columnar",
+        CLIP_VECTOR_SIZE=dim,
+        INDEX_UPLOAD_PARALLEL=1,  # the in-memory client uploads in-process
+    )
+    runs = {
+        "metadata": (lambda: build_metadata_database(db_path, bulk=True), "video"),
+        "normalize": (lambda: normalize_raw_data(), "row"),
+        "keyframes": (lambda: build_keyframes_database(db_path, bulk=True), "row"),
+        "objects": (lambda: build_objects_database(db_path, bulk=True), "row"),
+        "indexes": (lambda: build_database_indexes(db_path, bulk=True), None),
+        "finalize": (lambda: finalize_database(db_path), None),
+        "clip": (lambda: index_builder.build_clip_vector_store(), "vector"),
+        "keywords": (lambda: index_builder.build_keyword_vector_store(), "keyword"),
+    }
+
+    results = []
+    with _override_settings(**overrides), _in_memory_qdrant() as memory_client:
+        for name in stages:
+            run, unit = runs[name]
+            print(f"\n===== BENCHMARK: {name} =====")
+            start_time = time.perf_counter()
+            entry = {"stage": name, "status": "done"}
+            try:
+                items = run()
+            except Exception as e:
+                items = None
+                entry.update(status="failed", error=repr(e))
+            entry["seconds"] = time.perf_counter() - start_time
+            if isinstance(items, int) and unit:
+                entry["items"] = items
+                entry[f"{unit}s_per_second"] = items / max(entry["seconds"], 1e-6)
+            entry["peak_rss_mb"] = _peak_rss_mb()
+            entry["db_bytes"] = os.path.getsize(db_path) if db_path.exists() else 0
+            if name == "clip":
+                entry["points"] = _point_count(memory_client, settings.QDRANT_VIDEO_COLLECTION_NAME)
+            elif name == "keywords":
+                entry["points"] = _point_count(memory_client, settings.QDRANT_KEYWORD_COLLECTION_NAME)
+            results.append(entry)
+
+    report = {"dataset": dataset, "stages": results}
+    with open(output_dir / "benchmark.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print("\n===== KẾT QUẢ BENCHMARK =====")
+    for entry in results:
+        rate = next((f"{v:,.0f} {k[:-len('_per_second')]}/s" for k, v in entry.items() if k.endswith("_per_second")), "")
+        rss = "n/a" if entry['peak_rss_mb'] is None else f"{entry['peak_rss_mb']:.0f}MB"
+        line = (f"{entry['stage']:<10} {entry['status']:<7} {entry['seconds']:8.2f}s {rate:>20}  "
+                f"RSS {rss}  DB {entry['db_bytes'] / 2**20:.1f}MB")
+        if "points" in entry:
+            line += f"  {entry['points']} points"
+        if "error" in entry:
+            line += f"  {entry['error']}"
+        print(line)
+    print(f"-> Báo cáo lưu tại {output_dir / 'benchmark.json'}")
+    return report
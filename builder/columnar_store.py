@@ -0,0 +1,118 @@
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+from config.settings import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # optional: without pyarrow the builders read the raw files
+    pa = None
+
+SCHEMAS = {
+    "keyframes": [
+        ("video_id", "string"), ("keyframe_id", "string"), ("pts_time", "float64"), ("frame_idx", "int64"),
+    ],
+    "objects": [
+        ("video_id", "string"), ("keyframe_id", "string"), ("object_name", "string"), ("confidence", "float64"),
+        ("ymin", "float64"), ("xmin", "float64"), ("ymax", "float64"), ("xmax", "float64"),
+    ],
+}
+COMPLETE_MARKER = "_COMPLETE"
+BATCH_PATTERN = re.compile(r'^(L\d+)_')
+
+def _schema(kind: str):
+    return pa.schema([(name, getattr(pa, dtype)()) for name, dtype in SCHEMAS[kind]])
+
+def store_dir() -> Path:
+    return Path(settings.COLUMNAR_STORE_DIR)
+
+def enabled() -> bool:
+    return pa is not None and settings.COLUMNAR_STORE_ENABLED
+
+def available() -> bool:
+    """True when a complete store exists that builders can read instead of raw files"""
+    return enabled() and (store_dir() / COMPLETE_MARKER).exists()
+
+def batch_of(video_id: str) -> str:
+    """Partition key: the data batch (L01_V001 -> L01)"""
+    match = BATCH_PATTERN.match(video_id)
+    return match.group(1) if match else "other"
+
+def _partition_path(kind: str, batch: str) -> Path:
+    return store_dir() / kind / f"batch={batch}" / "part-0.parquet"
+
+def begin_full_rewrite():
+    """Drop the store; it stays unavailable until mark_complete()"""
+    shutil.rmtree(store_dir(), ignore_errors=True)
+    store_dir().mkdir(parents=True, exist_ok=True)
+
+def mark_complete():
+    (store_dir() / COMPLETE_MARKER).touch()
+
+def write_partition(kind: str, batch: str, table, replace_video_ids: Optional[Iterable[str]] = None):
+    """Write one batch partition atomically.
+
+    With replace_video_ids the existing partition is kept except for rows of
+    those videos, and `table` (their new rows, possibly empty) is appended.
+    """
+    path = _partition_path(kind, batch)
+    table = table.cast(_schema(kind))
+    if replace_video_ids is not None and path.exists():
+        existing = pq.read_table(path, schema=_schema(kind))
+        keep = pc.invert(pc.is_in(existing["video_id"], value_set=pa.array(sorted(replace_video_ids), pa.string())))
+        table = pa.concat_tables([existing.filter(keep), table])
+    # sorted by video so row group statistics prune reads of a few videos
+    table = table.sort_by([("video_id", "ascending"), ("keyframe_id", "ascending")])
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")  # dot files are not read as part of the dataset
+    pq.write_table(table, tmp_path, compression=settings.COLUMNAR_STORE_COMPRESSION)
+    os.replace(tmp_path, path)
+
+def table_from_frame(kind: str, frame):
+    return pa.Table.from_pandas(frame[[name for name, _ in SCHEMAS[kind]]], schema=_schema(kind), preserve_index=False)
+
+def table_from_rows(kind: str, rows: List[tuple]):
+    names = [name for name, _ in SCHEMAS[kind]]
+    columns = list(zip(*rows)) if rows else [[] for _ in names]
+    return pa.table(dict(zip(names, columns)), schema=_schema(kind))
+
+def dataset(kind: str):
+    return ds.dataset(store_dir() / kind, schema=_schema(kind), format="parquet")
+
+def iter_columns(kind: str, video_ids: Optional[Iterable[str]] = None,
+                 batch_rows: Optional[int] = None) -> Iterator[Tuple[int, List[list]]]:
+    """(row count, columns) per record batch, optionally for some videos only.
+
+    Columns are in schema order and converted with to_pylist(), a copy into
+    Python objects, since sqlite3 binds only Python values.
+    """
+    if not (store_dir() / kind).exists():
+        return
+    names = [name for name, _ in SCHEMAS[kind]]
+    row_filter = None
+    if video_ids is not None:
+        row_filter = ds.field("video_id").isin(sorted(video_ids))
+
+    scanner = dataset(kind).scanner(
+        columns=names,
+        filter=row_filter,
+        batch_size=batch_rows or settings.BUILD_INSERT_CHUNK_ROWS
+    )
+    for record_batch in scanner.to_batches():
+        if record_batch.num_rows:
+            yield record_batch.num_rows, [record_batch.column(i).to_pylist() for i in range(len(names))]
+
+def iter_rows(kind: str, video_ids: Optional[Iterable[str]] = None,
+              batch_rows: Optional[int] = None) -> Iterator[List[tuple]]:
+    """Row iterator: a list of row tuples per record batch (see iter_columns)"""
+    for _, columns in iter_columns(kind, video_ids, batch_rows):
+        yield list(zip(*columns))
+
+def size_bytes() -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(store_dir()) for f in files)
@@ -2,15 +2,156 @@ import sqlite3
 import json
 import glob
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+from pathlib import Path
 from config.settings import settings
+from utils.query_parser import QueryParser
+from tools.query_stats import full_scans
 from tqdm import tqdm
 import pandas as pd
+from . import columnar_store
 
-def build_metadata_database():
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+def _connect(db_path=None, bulk=False):
+    """Builder connection; bulk=True trades durability for load speed (journal and fsync off).
+    
+    Only for files nothing else reads and that are rebuilt from scratch if
+    the build dies, i.e. the staging file of a full build.
+    """
+    conn = sqlite3.connect(db_path or settings.METADATA_KEYFRAME_OBJECT_DB_PATH)
+    if bulk:
+        for name, value in settings.SQLITE_BULK_LOAD_PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+def _insert_chunked(conn, query, rows):
+    """executemany in BUILD_INSERT_CHUNK_ROWS-sized transactions"""
+    for i in range(0, len(rows), settings.BUILD_INSERT_CHUNK_ROWS):
+        with conn:
+            conn.executemany(query, rows[i:i + settings.BUILD_INSERT_CHUNK_ROWS])
+
+def _report_rate(table, rows, start_time):
+    elapsed = max(time.perf_counter() - start_time, 1e-6)
+    print(f"-> {table}: {rows} dòng trong {elapsed:.1f}s ({rows / elapsed:,.0f} row/s)")
+
+def build_metadata_fts(cursor):
+    """(Re)build the FTS5 index over video title, description, keywords and author"""
+    cursor.execute("DROP TABLE IF EXISTS videos_fts")
+    # nội dung được bỏ dấu trước khi index (kể cả đ -> d), query cũng được bỏ dấu giống vậy
+    cursor.execute('''
+    CREATE VIRTUAL TABLE videos_fts USING fts5(
+        video_id UNINDEXED,
+        title,
+        description,
+        keywords,
+        author,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    ''')
+    
+    rows = cursor.execute("SELECT video_id, title, description, keywords, author FROM videos").fetchall()
+    cursor.executemany(
+        "INSERT INTO videos_fts (video_id, title, description, keywords, author) VALUES (?, ?, ?, ?, ?)",
+        [
+            (video_id, *(QueryParser.fold_diacritics(value or "") for value in fields))
+            for video_id, *fields in rows
+        ]
+    )
+    cursor.execute("INSERT INTO videos_fts (videos_fts) VALUES ('optimize')")
+    return len(rows)
+
+def _table_exists(cursor, name: str) -> bool:
+    return cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+def _video_condition(video_ids, column: str = "video_id"):
+    """SQL condition and params restricting a statement to video_ids (None = all videos)"""
+    if video_ids is None:
+        return "1", ()
+    return f"{column} IN (SELECT value FROM json_each(?))", (json.dumps(sorted(video_ids)),)
+
+def build_objects_rtree(cursor, video_ids=None):
+    """(Re)build the R*Tree over object bounding boxes, keyed by objects.id.
+    
+    With video_ids only the boxes of those videos are added (their old
+    entries are removed by delete_videos).
+    """
+    if video_ids is None or not _table_exists(cursor, "objects_rtree"):
+        video_ids = None
+        cursor.execute("DROP TABLE IF EXISTS objects_rtree")
+    # chiều thứ 3 là diện tích box (min = max) để lọc min_area cũng đi qua index
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS objects_rtree USING rtree(
+        id,
+        xmin, xmax,
+        ymin, ymax,
+        area_min, area_max
+    )
+    ''')
+    condition, params = _video_condition(video_ids)
+    cursor.execute(f'''
+    INSERT INTO objects_rtree (id, xmin, xmax, ymin, ymax, area_min, area_max)
+    SELECT id, xmin, xmax, ymin, ymax,
+           (xmax - xmin) * (ymax - ymin), (xmax - xmin) * (ymax - ymin)
+    FROM objects
+    WHERE {condition}
+    ''', params)
+    return cursor.rowcount
+
+def build_object_counts(cursor, video_ids=None):
+    """(Re)build the per-keyframe count of each object class, for counting queries"""
+    if video_ids is None or not _table_exists(cursor, "keyframe_object_counts"):
+        video_ids = None
+        cursor.execute("DROP TABLE IF EXISTS keyframe_object_counts")
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS keyframe_object_counts (
+        video_id TEXT,
+        keyframe_id TEXT,
+        object_name TEXT,
+        count INTEGER,
+        PRIMARY KEY (object_name, video_id, keyframe_id)
+    ) WITHOUT ROWID
+    ''')
+    # chỉ đếm các detection đủ tin cậy, cùng ngưỡng với ObjectIndex
+    condition, params = _video_condition(video_ids)
+    cursor.execute(f'''
+    INSERT INTO keyframe_object_counts (video_id, keyframe_id, object_name, count)
+    SELECT video_id, keyframe_id, object_name, COUNT(*)
+    FROM objects
+    WHERE confidence >= ? AND {condition}
+    GROUP BY video_id, keyframe_id, object_name
+    ''', (settings.OBJECT_COUNT_MIN_CONFIDENCE, *params))
+    return cursor.rowcount
+
+def delete_videos(db_path, video_ids):
+    """Remove every row of video_ids, before they are re-ingested or because their files are gone"""
+    if not video_ids:
+        return
+    conn = sqlite3.connect(db_path or settings.METADATA_KEYFRAME_OBJECT_DB_PATH)
+    cursor = conn.cursor()
+    condition, params = _video_condition(video_ids)
+    
+    if _table_exists(cursor, "objects_rtree"):
+        cursor.execute(f"DELETE FROM objects_rtree WHERE id IN (SELECT id FROM objects WHERE {condition})", params)
+    # videos_fts cũng phải xoá: batch chỉ có video bị xoá sẽ không build lại FTS
+    for table in ["keyframe_object_counts", "objects", "keyframes", "videos", "videos_fts"]:
+        if _table_exists(cursor, table):
+            cursor.execute(f"DELETE FROM {table} WHERE {condition}", params)
+    
+    conn.commit()
+    conn.close()
+
+def build_metadata_database(db_path=None, video_ids=None, bulk=False):
     # connect to database (create if not exists)
     print("Bắt đầu xây dựng metadata database...")
-    conn = sqlite3.connect(settings.METADATA_KEYFRAME_OBJECT_DB_PATH)
+    start_time = time.perf_counter()
+    conn = _connect(db_path, bulk)
     cursor = conn.cursor()
     
     # create table if not exists
@@ -35,7 +176,10 @@ def build_metadata_database():
     if not metadata_files:
         print(f"LỖI: Không tìm thấy file metadata nào trong thư mục: {settings.RAW_METADATA_DIR}")
         return
+    if video_ids is not None:
+        metadata_files = [f for f in metadata_files if os.path.splitext(os.path.basename(f))[0] in video_ids]
     
+    videos_to_insert = []
     for file_path in tqdm(metadata_files):
         video_id = os.path.splitext(os.path.basename(file_path))[0] # taje video_id from filename
         
@@ -53,37 +197,62 @@ def build_metadata_database():
         # combine all keywords into one string
         keywords_str = ", ".join([word.lower() for word in data.get("keywords", [])])
 
-        cursor.execute(
-            """
-            INSERT OR REPLACE INTO videos (video_id, author, channel_id, channel_url, description, keywords, length, publish_date, thumbnail_url, title, watch_url)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                video_id,
-                data.get("author").lower(),
-                data.get("channel_id"),
-                data.get("channel_url"),
-                data.get("description").lower(),
-                keywords_str,
-                data.get("length"),
-                formatted_date,
-                data.get("thumbnail_url"),
-                data.get("title").lower(),
-                data.get("watch_url")
-            )
-        )
+        videos_to_insert.append((
+            video_id,
+            data.get("author").lower(),
+            data.get("channel_id"),
+            data.get("channel_url"),
+            data.get("description").lower(),
+            keywords_str,
+            data.get("length"),
+            formatted_date,
+            data.get("thumbnail_url"),
+            data.get("title").lower(),
+            data.get("watch_url")
+        ))
+    
+    _insert_chunked(
+        conn,
+        """
+        INSERT OR REPLACE INTO videos (video_id, author, channel_id, channel_url, description, keywords, length, publish_date, thumbnail_url, title, watch_url)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        videos_to_insert
+    )
+    _report_rate("videos", len(videos_to_insert), start_time)
+        
+    indexed = build_metadata_fts(cursor)
+    print(f"-> Đã tạo FTS5 index cho {indexed} video")
         
     conn.commit()
     conn.close()
     print(f"-> Đã xử lý {len(metadata_files)} file metadata. Xây dựng metadata database thành công!")
+    return len(metadata_files)
     
-def build_keyframes_database():
+def _keyframe_files(video_ids=None):
+    files = glob.glob(os.path.join(settings.RAW_MAP_KEYFRAME_DIR, '**', '*.csv'), recursive=True)
+    if files and video_ids is not None:
+        files = [f for f in files if os.path.splitext(os.path.basename(f))[0] in video_ids]
+    return files
+
+def read_keyframe_csv(file_path) -> pd.DataFrame:
+    """keyframes rows (video_id, keyframe_id, pts_time, frame_idx) of one map-keyframes CSV"""
+    df = pd.read_csv(file_path, usecols=['n', 'pts_time', 'frame_idx'])
+    return pd.DataFrame({
+        'video_id': os.path.splitext(os.path.basename(file_path))[0],
+        'keyframe_id': df['n'].astype(int).astype(str).str.zfill(3),
+        'pts_time': df['pts_time'].astype(float),
+        'frame_idx': df['frame_idx'].astype(int),
+    })
+
+def build_keyframes_database(db_path=None, video_ids=None, bulk=False):
     print("Bắt đầu xây dựng keyframe database...")
-    conn = sqlite3.connect(settings.METADATA_KEYFRAME_OBJECT_DB_PATH)
+    start_time = time.perf_counter()
+    conn = _connect(db_path, bulk)
     cursor = conn.cursor()
     
     cursor.execute('''
-    CREATE TABLE keyframes (
+    CREATE TABLE IF NOT EXISTS keyframes (
         video_id TEXT,
         keyframe_id TEXT,
         pts_time FLOAT,
@@ -93,7 +262,23 @@ def build_keyframes_database():
     );         
     ''')
     
-    map_keyframe_files = glob.glob(os.path.join(settings.RAW_MAP_KEYFRAME_DIR, '**', '*.csv'), recursive=True)
+    insert_query = """
+    INSERT OR REPLACE INTO keyframes (video_id, keyframe_id, pts_time, frame_idx)
+    VALUES (?, ?, ?, ?)
+    """
+    if columnar_store.available():
+        # đọc từ Parquet đã chuẩn hoá thay vì parse lại CSV
+        total_rows = 0
+        for num_rows, columns in columnar_store.iter_columns("keyframes", video_ids):
+            with conn:
+                conn.executemany(insert_query, zip(*columns))
+            total_rows += num_rows
+        conn.close()
+        _report_rate("keyframes", total_rows, start_time)
+        print(f"-> Đã nạp {total_rows} keyframe từ columnar store. Xây dựng keyframe database thành công!")
+        return total_rows
+    
+    map_keyframe_files = _keyframe_files(video_ids)
     if not map_keyframe_files:
         print(f"LỖI: Không tìm thấy file object nào trong thư mục: {settings.RAW_MAP_KEYFRAME_DIR}")
         return
@@ -101,108 +286,357 @@ def build_keyframes_database():
     keyframes_to_insert = []
     for file_path in tqdm(map_keyframe_files):
         try:
-            parts = file_path.replace('\\', '/').split('/')
-            video_id = os.path.splitext(parts[-1])[0]
-            
-            df = pd.read_csv(file_path)
-            pts_time = df['pts_time'].tolist()
-            frame_idx = df['frame_idx'].tolist()
-            
-            for i in range(len(df)):
-                keyframe_id = str(int(df['n'].iloc[i])).zfill(3)
-                    
-                keyframes_to_insert.append((
-                    video_id,
-                    keyframe_id,
-                    pts_time[i],
-                    frame_idx[i]
-                ))
-                
-                
+            keyframes_to_insert.extend(read_keyframe_csv(file_path).itertuples(index=False, name=None))
         except Exception as e:
             print(f"CẢNH BÁO: Bỏ qua file keyframe bị lỗi {file_path}. Lỗi: {e}")
             continue
     
-    if keyframes_to_insert:
-        cursor.executemany(
-            """
-            INSERT INTO keyframes (video_id, keyframe_id, pts_time, frame_idx)
-            VALUES (?, ?, ?, ?)
-            """,
-            keyframes_to_insert
-        )
+    _insert_chunked(conn, insert_query, keyframes_to_insert)
+    _report_rate("keyframes", len(keyframes_to_insert), start_time)
     
     conn.commit()
     conn.close()
     print(f"-> Đã xử lý {len(map_keyframe_files)} file keyframe. Xây dựng keyframe database thành công!")
+    return len(keyframes_to_insert)
             
-def build_objects_database():
-    print("Bắt đầu xây dựng object database...")
-    conn = sqlite3.connect(settings.METADATA_KEYFRAME_OBJECT_DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS objects (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        video_id TEXT,
-        keyframe_id TEXT,
-        object_name TEXT,
-        confidence REAL,
-        ymin REAL,
-        xmin REAL,
-        ymax REAL,
-        xmax REAL,
-        FOREIGN KEY (video_id, keyframe_id) REFERENCES keyframes(video_id, keyframe_id)
-    )
-    ''')
-
-    object_files = glob.glob(os.path.join(settings.RAW_OBJECT_DIR, '**', '*.json'), recursive=True)
-    if not object_files:
-        print(f"LỖI: Không tìm thấy file object nào trong thư mục: {settings.RAW_OBJECT_DIR}")
-        return
-        
-    objects_to_insert = []
-    for file_path in tqdm(object_files):
+def _parse_object_files(file_paths):
+    """Parse object JSON files into objects rows; runs in a worker process"""
+    rows = []
+    errors = []
+    for file_path in file_paths:
         try:
             parts = file_path.replace('\\', '/').split('/')
             video_id = parts[-2]
             keyframe_id = os.path.splitext(parts[-1])[0]
 
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with open(file_path, 'rb') as f:
+                data = _json_loads(f.read())
 
             # "Giải nén" cấu trúc dữ liệu
             scores = data.get("detection_scores", [])
             names = data.get("detection_class_entities", [])
-            names = [n.lower() for n in names]
             boxes = data.get("detection_boxes", [])
             
+            file_rows = []
             # Lặp qua từng đối tượng được phát hiện trong file
             for i in range(len(scores)):
                 box = boxes[i]
-                objects_to_insert.append((
+                file_rows.append((
                     video_id,
                     keyframe_id,
-                    names[i],
+                    names[i].lower(),
                     float(scores[i]),
                     float(box[0]), # ymin
                     float(box[1]), # xmin
                     float(box[2]), # ymax
                     float(box[3])  # xmax
                 ))
-        except (json.JSONDecodeError, IndexError, KeyError, ValueError) as e:
-            print(f"CẢNH BÁO: Bỏ qua file object bị lỗi {file_path}. Lỗi: {e}")
-            continue
+            rows.extend(file_rows)
+        except (ValueError, IndexError, KeyError, TypeError, OSError) as e:
+            errors.append((file_path, str(e)))
+    return rows, errors, len(file_paths)
+
+def _iter_parsed_object_tasks(tasks, workers):
+    """Yield parsed tasks as workers finish them, with a bounded number in flight"""
+    if workers <= 1:
+        for task in tasks:
+            yield _parse_object_files(task)
+        return
+    
+    max_in_flight = workers * 2
+    pending_tasks = iter(tasks)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        for task in pending_tasks:
+            in_flight.add(executor.submit(_parse_object_files, task))
+            if len(in_flight) >= max_in_flight:
+                break
+        
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                next_task = next(pending_tasks, None)
+                if next_task is not None:
+                    in_flight.add(executor.submit(_parse_object_files, next_task))
+
+def _object_files(video_ids=None):
+    files = glob.glob(os.path.join(settings.RAW_OBJECT_DIR, '**', '*.json'), recursive=True)
+    if files and video_ids is not None:
+        files = [f for f in files if os.path.basename(os.path.dirname(f)) in video_ids]
+    return files
 
-    if objects_to_insert:
-        cursor.executemany(
+def _object_tasks(object_files):
+    return [
+        object_files[i:i + settings.BUILD_FILES_PER_TASK]
+        for i in range(0, len(object_files), settings.BUILD_FILES_PER_TASK)
+    ]
+
+def _insert_objects(conn, rows):
+    with conn:
+        conn.executemany(
             """
             INSERT INTO objects (video_id, keyframe_id, object_name, confidence, ymin, xmin, ymax, xmax)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """,
-            objects_to_insert
+            rows
         )
+
+def build_objects_database(db_path=None, video_ids=None, bulk=False):
+    print("Bắt đầu xây dựng object database...")
+    conn = _connect(db_path, bulk)
+    cursor = conn.cursor()
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS objects (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        video_id TEXT,
+        keyframe_id TEXT,
+        object_name TEXT,
+        confidence REAL,
+        ymin REAL,
+        xmin REAL,
+        ymax REAL,
+        xmax REAL,
+        FOREIGN KEY (video_id, keyframe_id) REFERENCES keyframes(video_id, keyframe_id)
+    )
+    ''')
+
+    if columnar_store.available():
+        # Parquet đã chuẩn hoá: mỗi record batch là một chunk, không cần parse JSON
+        unit, total_units = "record batch", None
+        parsed = ((rows, [], 1) for rows in columnar_store.iter_rows("objects", video_ids))
+    else:
+        object_files = _object_files(video_ids)
+        if not object_files:
+            print(f"LỖI: Không tìm thấy file object nào trong thư mục: {settings.RAW_OBJECT_DIR}")
+            return
+        unit, total_units = "file", len(object_files)
+        parsed = _iter_parsed_object_tasks(_object_tasks(object_files), settings.BUILD_PARSE_WORKERS)
     
+    # một writer duy nhất: ghi theo chunk cố định, mỗi chunk một transaction
+    buffer = []
+    total_rows = 0
+    done_units = 0
+    start_time = time.perf_counter()
+    progress = tqdm(total=total_units, unit=unit)
+    
+    for rows, errors, unit_count in parsed:
+        for file_path, error in errors:
+            print(f"CẢNH BÁO: Bỏ qua file object bị lỗi {file_path}. Lỗi: {error}")
+        
+        buffer.extend(rows)
+        while len(buffer) >= settings.BUILD_INSERT_CHUNK_ROWS:
+            _insert_objects(conn, buffer[:settings.BUILD_INSERT_CHUNK_ROWS])
+            del buffer[:settings.BUILD_INSERT_CHUNK_ROWS]
+        
+        total_rows += len(rows)
+        done_units += unit_count
+        elapsed = max(time.perf_counter() - start_time, 1e-6)
+        progress.update(unit_count)
+        progress.set_postfix(rows=total_rows, rows_s=f"{total_rows / elapsed:,.0f}")
+    
+    if buffer:
+        _insert_objects(conn, buffer)
+    progress.close()
+    
+    elapsed = max(time.perf_counter() - start_time, 1e-6)
+    print(f"-> Đã nạp {total_rows} object trong {elapsed:.1f}s "
+          f"({done_units / elapsed:,.0f} {unit}/s, {total_rows / elapsed:,.0f} row/s)")
+    
+    rtree_rows = build_objects_rtree(cursor, video_ids)
+    build_object_counts(cursor, video_ids)
     conn.commit()
     conn.close()
-    print(f"-> Đã xử lý {len(object_files)} file object. Xây dựng object database thành công!")
\ No newline at end of file
+    print(f"-> Đã xử lý {done_units} {unit} object, {rtree_rows} bounding box. Xây dựng object database thành công!")
+    return total_rows
+
+def normalize_raw_data(video_ids=None, removed_video_ids=()):
+    """Convert map-keyframes CSVs and object JSONs into the Parquet columnar store.
+    
+    Each data batch (L01, L02, ...) becomes one Parquet file per table, which
+    the keyframe and object builders then read instead of the raw files.
+    With video_ids only those videos and removed_video_ids are rewritten in
+    an existing store; otherwise the whole store is rebuilt.
+    """
+    if not columnar_store.enabled():
+        print("-> Bỏ qua columnar store (cần pyarrow và COLUMNAR_STORE_ENABLED)")
+        return 0
+    incremental = video_ids is not None
+    if incremental and not columnar_store.available():
+        print("-> Chưa có columnar store đầy đủ, các bước sau sẽ đọc file gốc")
+        return 0
+    
+    print("Bắt đầu chuẩn hoá dữ liệu sang Parquet...")
+    start_time = time.perf_counter()
+    if not incremental:
+        columnar_store.begin_full_rewrite()
+    replaced = set(video_ids or ()) | set(removed_video_ids) if incremental else None
+    
+    keyframe_files, object_files = {}, {}
+    for file_path in _keyframe_files(video_ids):
+        keyframe_files.setdefault(columnar_store.batch_of(os.path.splitext(os.path.basename(file_path))[0]), []).append(file_path)
+    for file_path in _object_files(video_ids):
+        object_files.setdefault(columnar_store.batch_of(os.path.basename(os.path.dirname(file_path))), []).append(file_path)
+    batches = set(keyframe_files) | set(object_files) | {columnar_store.batch_of(v) for v in removed_video_ids}
+    
+    total_rows = 0
+    for batch in tqdm(sorted(batches), unit="batch"):
+        frames = []
+        for file_path in keyframe_files.get(batch, []):
+            try:
+                frames.append(read_keyframe_csv(file_path))
+            except Exception as e:
+                print(f"CẢNH BÁO: Bỏ qua file keyframe bị lỗi {file_path}. Lỗi: {e}")
+        keyframes = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+            {'video_id': [], 'keyframe_id': [], 'pts_time': [], 'frame_idx': []})
+        columnar_store.write_partition("keyframes", batch, columnar_store.table_from_frame("keyframes", keyframes), replaced)
+        
+        objects = []
+        tasks = _object_tasks(object_files.get(batch, []))
+        for rows, errors, _ in _iter_parsed_object_tasks(tasks, settings.BUILD_PARSE_WORKERS):
+            for file_path, error in errors:
+                print(f"CẢNH BÁO: Bỏ qua file object bị lỗi {file_path}. Lỗi: {error}")
+            objects.extend(rows)
+        columnar_store.write_partition("objects", batch, columnar_store.table_from_rows("objects", objects), replaced)
+        total_rows += len(keyframes) + len(objects)
+    
+    if not incremental:
+        columnar_store.mark_complete()
+    elapsed = max(time.perf_counter() - start_time, 1e-6)
+    print(f"-> Đã chuẩn hoá {total_rows} dòng của {len(batches)} batch trong {elapsed:.1f}s "
+          f"({total_rows / elapsed:,.0f} row/s), columnar store {columnar_store.size_bytes() / 2**20:.1f}MB")
+    return total_rows
+
+# indexes for the hot SQLiteTool queries, created after bulk load so inserts stay cheap
+DATABASE_INDEXES = {
+    "idx_objects_name_confidence": "objects (object_name, confidence, video_id, keyframe_id)",
+    "idx_objects_keyframe": "objects (video_id, keyframe_id)",
+    "idx_keyframes_video_time": "keyframes (video_id, pts_time)",
+}
+
+# (name, query, params) of the queries that must be index-driven
+HOT_QUERIES = [
+    (
+        "search_objects",
+        """
+        SELECT o.video_id, o.keyframe_id, AVG(o.confidence), COUNT(*), k.pts_time, k.frame_idx
+        FROM objects o
+        JOIN keyframes k ON o.video_id = k.video_id AND o.keyframe_id = k.keyframe_id
+        WHERE o.object_name IN (?, ?) AND o.confidence >= ?
+        GROUP BY o.video_id, o.keyframe_id
+        """,
+        ("person", "car", 0.5)
+    ),
+    (
+        "get_keyframe_objects",
+        "SELECT object_name, confidence FROM objects WHERE video_id = ? AND keyframe_id = ? ORDER BY confidence DESC",
+        ("L01_V001", "001")
+    ),
+    (
+        "get_objects_for_keyframes",
+        """
+        SELECT video_id, keyframe_id, object_name, confidence FROM objects
+        WHERE (video_id, keyframe_id) IN (
+            SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)
+        )
+        """,
+        ('[["L01_V001", "001"]]',)
+    ),
+    (
+        "search_objects_spatial",
+        """
+        SELECT o.video_id, o.keyframe_id, o.object_name, o.confidence
+        FROM objects_rtree r
+        JOIN objects o ON o.id = r.id
+        WHERE r.xmin >= ? AND r.xmax <= ? AND r.ymin >= ? AND r.ymax <= ? AND r.area_max >= ?
+        AND o.object_name IN (?) AND o.confidence >= ?
+        """,
+        (0.0, 0.5, 0.0, 1.0, 0.05, "person", 0.5)
+    ),
+    (
+        "search_keyframes_by_counts",
+        """
+        SELECT c.video_id, c.keyframe_id, json_group_object(c.object_name, c.count)
+        FROM keyframe_object_counts c
+        WHERE c.object_name IN (?, ?)
+        GROUP BY c.video_id, c.keyframe_id
+        HAVING COALESCE(SUM(CASE WHEN c.object_name = ? THEN c.count END), 0) BETWEEN ? AND ?
+        """,
+        ("person", "motorbike", "person", 3, 3)
+    ),
+    (
+        "get_keyframes_in_timerange",
+        """
+        SELECT k.*, v.title FROM keyframes k JOIN videos v ON k.video_id = v.video_id
+        WHERE k.video_id = ? AND k.pts_time BETWEEN ? AND ? ORDER BY k.pts_time
+        """,
+        ("L01_V001", 0.0, 60.0)
+    ),
+]
+
+def build_database_indexes(db_path=None, bulk=False):
+    print("Bắt đầu tạo index cho database...")
+    conn = _connect(db_path, bulk)
+    cursor = conn.cursor()
+    
+    for index_name, definition in tqdm(DATABASE_INDEXES.items()):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {definition}")
+    
+    # cập nhật thống kê để query planner chọn đúng index
+    cursor.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    print(f"-> Đã tạo {len(DATABASE_INDEXES)} index và chạy ANALYZE.")
+
+def finalize_database(db_path):
+    """Compact a bulk-loaded file with VACUUM INTO and give it serving pragmas.
+    
+    The copy is written next to db_path and then renamed over it, so
+    db_path is always either the loaded file or the finished one.
+    """
+    print("Bắt đầu VACUUM INTO bản cuối...")
+    db_path = Path(db_path)
+    compact_path = db_path.with_name(f"{db_path.name}.compact")
+    if compact_path.exists():
+        os.remove(compact_path)
+    size_before = os.path.getsize(db_path)
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("VACUUM INTO ?", (str(compact_path),))
+    finally:
+        conn.close()
+    
+    # journal_mode là thiết lập duy nhất được lưu trong file
+    conn = sqlite3.connect(compact_path)
+    try:
+        conn.execute(f"PRAGMA journal_mode = {settings.SQLITE_SERVING_JOURNAL_MODE}")
+        integrity = conn.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        conn.close()
+    if integrity != "ok":
+        raise sqlite3.DatabaseError(f"quick_check failed on {compact_path}: {integrity}")
+    
+    os.replace(compact_path, db_path)
+    size_after = os.path.getsize(db_path)
+    print(f"-> Database {size_before / 2**20:.1f}MB -> {size_after / 2**20:.1f}MB sau VACUUM INTO")
+    return size_after
+
+def verify_query_plans(db_path=None) -> dict:
+    """Check with EXPLAIN QUERY PLAN that no hot query scans a whole table"""
+    conn = sqlite3.connect(db_path or settings.METADATA_KEYFRAME_OBJECT_DB_PATH)
+    report = {}
+    
+    for name, query, params in HOT_QUERIES:
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        # mọi "SCAN <table>" đều là đọc hết bảng/index, kể cả "USING COVERING INDEX"
+        scans = full_scans(plan)
+        report[name] = {"plan": plan, "full_scans": scans}
+        if scans:
+            print(f"CẢNH BÁO: Query '{name}' vẫn full scan: {scans}")
+        else:
+            print(f"-> Query '{name}' dùng index: {plan}")
+    
+    conn.close()
+    return report
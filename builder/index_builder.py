@@ -1,141 +1,384 @@
 import os
 import glob
 import json
+import time
+import hashlib
 import numpy as np
 from qdrant_client import QdrantClient, models
 from config.settings import settings
 from tqdm import tqdm
+from tools.shard_router import get_video_shards, shard_for_video
+from .versioning import (
+    new_build_version,
+    versioned_collection_name,
+    resolve_alias,
+    warm_collection,
+    publish_collection,
+    gc_collection_versions,
+    bulk_load_config,
+    restore_indexing,
+    verify_point_count
+)
 
 client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
 
-def build_clip_vector_store():
-    print("Bắt đầu xây dựng CLIP vector store với Qdrant...")
-    vector_size = 512
-    # create or recreate collection
-    client.recreate_collection(
-        collection_name=settings.QDRANT_VIDEO_COLLECTION_NAME,
-        vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE),
-    )
-    print(f"-> Collection '{settings.QDRANT_VIDEO_COLLECTION_NAME}' đã được tạo/tái tạo.")
+def stable_point_id(*parts: str) -> int:
+    """64-bit point id derived from its key, e.g. (video_id, keyframe_id).
+    
+    The same keyframe gets the same id in every build, so incremental builds
+    can upsert it in place instead of depending on file order.
+    """
+    digest = hashlib.blake2b("/".join(parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+def _upload_clip_file(shard_client, collection_name, file_path, batch_size=None):
+    """Upsert every keyframe vector of one .npy file; returns the point ids"""
+    video_id = os.path.splitext(os.path.basename(file_path))[0]
+    batch_size = batch_size or settings.INDEX_UPLOAD_BATCH_SIZE
     
+    vectors = np.load(file_path, mmap_mode='r')
+    point_ids = [stable_point_id(video_id, f"{i:03d}") for i in range(vectors.shape[0])]
+    
+    for start in range(0, len(point_ids), batch_size):
+        end = start + batch_size
+        shard_client.upsert(
+            collection_name=collection_name,
+            points=models.Batch(
+                ids=point_ids[start:end],
+                vectors=np.asarray(vectors[start:end], dtype=np.float32).tolist(),
+                payloads=[{"video_id": video_id, "keyframe_id": f"{i:03d}"} for i in range(start, min(end, len(point_ids)))]
+            ),
+            wait=True
+        )
+    
+    return point_ids
+
+def _clip_files(file_paths, vector_size):
+    """(video_id, path, keyframe count) of every readable .npy file; only headers are read"""
+    files = []
+    for file_path in file_paths:
+        try:
+            vectors = np.load(file_path, mmap_mode='r')
+            if vectors.ndim != 2 or vectors.shape[1] != vector_size:
+                raise ValueError(f"shape {vectors.shape}, cần (n, {vector_size})")
+            files.append((os.path.splitext(os.path.basename(file_path))[0], file_path, vectors.shape[0]))
+        except Exception as e:
+            print(f"CẢNH BÁO: Bỏ qua file {file_path} do lỗi: {e}")
+    return files
+
+def _iter_clip_vectors(files):
+    for _, file_path, _ in files:
+        # đọc qua mmap, mỗi lần chỉ một video nằm trong RAM
+        yield from np.asarray(np.load(file_path, mmap_mode='r'), dtype=np.float32)
+
+def _iter_clip_ids(files):
+    for video_id, _, num_keyframes in files:
+        for i in range(num_keyframes):
+            yield stable_point_id(video_id, f"{i:03d}")
+
+def _iter_clip_payloads(files):
+    for video_id, _, num_keyframes in files:
+        for i in range(num_keyframes):
+            yield {"video_id": video_id, "keyframe_id": f"{i:03d}"}
+
+def _bulk_upload_clip_files(shard_client, collection_name, files):
+    """Stream the vectors of many files through the client's parallel bulk upload.
+    
+    Vectors, ids and payloads are three generators over the same file list,
+    so they stay aligned without materialising a point per keyframe. Uploads
+    are not acknowledged (wait=False); the caller verifies the final count.
+    """
+    shard_client.upload_collection(
+        collection_name=collection_name,
+        vectors=_iter_clip_vectors(files),
+        ids=_iter_clip_ids(files),
+        payload=_iter_clip_payloads(files),
+        batch_size=settings.INDEX_UPLOAD_BATCH_SIZE,
+        parallel=settings.INDEX_UPLOAD_PARALLEL,
+        wait=False
+    )
+    return sum(num_keyframes for _, _, num_keyframes in files)
+
+def _delete_stale_points(shard_client, collection_name, key, value, keep_ids=()):
+    """Delete points whose payload `key` equals value, except the ids just upserted"""
+    shard_client.delete(
+        collection_name=collection_name,
+        points_selector=models.FilterSelector(filter=models.Filter(
+            must=[models.FieldCondition(key=key, match=models.MatchValue(value=value))],
+            must_not=[models.HasIdCondition(has_id=list(keep_ids))] if keep_ids else None
+        )),
+        wait=True
+    )
+
+def build_clip_vector_store(version=None, publish=True):
+    """Build and warm a new version of every keyframe shard.
+
+    With publish=False the aliases are left alone until
+    publish_clip_vector_store(version) is called.
+    """
+    print("Bắt đầu xây dựng CLIP vector store với Qdrant...")
+    vector_size = settings.CLIP_VECTOR_SIZE
+    version = version or new_build_version()
+
     # take all file .npy
     clip_feature_files = glob.glob(os.path.join(settings.RAW_CLIPFEATURE_DIR, '*.npy'))
     if not clip_feature_files:
         print(f"LỖI: Không tìm thấy file .npy nào trong thư mục: {settings.RAW_CLIPFEATURE_DIR}")
         return
+
+    # mỗi shard là một (client, alias); build vào collection mới, collection đang phục vụ
+    # chỉ bị thay khi alias được chuyển
+    shards = get_video_shards()
+    targets = []
+    for shard_client, alias in shards:
+        collection_name = versioned_collection_name(alias, version)
+        shard_client.create_collection(
+            collection_name=collection_name,
+            vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE),
+            # HNSW được build một lần sau khi upload xong
+            **bulk_load_config()
+        )
+        # index video_id để Qdrant group kết quả theo video
+        shard_client.create_payload_index(
+            collection_name=collection_name,
+            field_name="video_id",
+            field_schema=models.PayloadSchemaType.KEYWORD
+        )
+        targets.append((shard_client, collection_name))
+        print(f"-> Collection '{collection_name}' đã được tạo.")
     
-    # use counter for each point id
-    point_id_counter = 0
-    batch_size = 500
+    total = 0
+    files_by_shard = [[] for _ in targets]
+    for video_id, file_path, num_keyframes in _clip_files(clip_feature_files, vector_size):
+        files_by_shard[shard_for_video(video_id, len(targets))].append((video_id, file_path, num_keyframes))
     
-    for file_path in tqdm(clip_feature_files):
-        try:
-            video_id = os.path.splitext(os.path.basename(file_path))[0]
-            
-            vectors = np.load(file_path)
-            vectors = vectors.astype('float32')
-            
-            num_keyframes = vectors.shape[0]
-            points_to_upload = []
-            
-            for i in range(num_keyframes):
-                keyframe_id = f"{i:03d}"
-                vector = vectors[i]
-                
-                point = models.PointStruct(
-                    id=point_id_counter,
-                    vector=vector.tolist(),
-                    payload={
-                        "video_id": video_id,
-                        "keyframe_id": keyframe_id
-                    }
-                )
-                points_to_upload.append(point)
-                point_id_counter += 1
-                
-                # upsert when equal batch_size
-                if len(points_to_upload) >= batch_size:
-                    client.upsert(
-                        collection_name=settings.QDRANT_VIDEO_COLLECTION_NAME,
-                        points=points_to_upload,
-                        wait=True
-                    )
-                    # print(f"-> Đã upload {len(points_to_upload)} điểm (batch).")
-                    points_to_upload = []
-                    
-            # upload the rest
-            if points_to_upload:
-                client.upsert(
-                    collection_name=settings.QDRANT_VIDEO_COLLECTION_NAME,
-                    points=points_to_upload,
-                    wait=True
-                )
-                # print(f"-> Đã upload {len(points_to_upload)} điểm (batch cuối).")
-                
-        except Exception as e:
-            print(f"CẢNH BÁO: Bỏ qua file {file_path} do lỗi: {e}")
-            continue
+    for (shard_client, collection_name), files in zip(targets, files_by_shard):
+        started = time.perf_counter()
+        expected = _bulk_upload_clip_files(shard_client, collection_name, files)
+        total += expected
+        verify_point_count(shard_client, collection_name, expected)
+        elapsed = time.perf_counter() - started
+        print(f"-> {collection_name}: {expected} vectors từ {len(files)} file, "
+              f"{expected / max(elapsed, 1e-9):.0f} vectors/s")
+        restore_indexing(shard_client, collection_name)
     
+    for shard_client, collection_name in targets:
+        warm_collection(shard_client, collection_name)
+    if publish:
+        publish_clip_vector_store(version)
     print("Hoàn tất upload tất cả feature ✅")
+    return total
+
+def publish_clip_vector_store(version):
+    """Move every shard's alias to the collections built for version"""
+    for shard_client, alias in get_video_shards():
+        collection_name = versioned_collection_name(alias, version)
+        if not shard_client.collection_exists(collection_name):
+            print(f"CẢNH BÁO: Không có collection '{collection_name}', giữ nguyên alias '{alias}'.")
+            continue
+        publish_collection(shard_client, alias, collection_name)
+        gc_collection_versions(shard_client, alias)
+
+def update_clip_vector_store(video_ids, removed_video_ids=()):
+    """Upsert changed videos into the live collections in place and drop removed ones.
+    
+    New vectors are written before stale points are deleted, so a video
+    never disappears from search while it is being updated.
+    """
+    shards = [(shard_client, resolve_alias(shard_client, alias) or alias) for shard_client, alias in get_video_shards()]
+    
+    for video_id in tqdm(sorted(video_ids)):
+        shard_client, collection_name = shards[shard_for_video(video_id, len(shards))]
+        file_path = os.path.join(settings.RAW_CLIPFEATURE_DIR, f"{video_id}.npy")
+        point_ids = _upload_clip_file(shard_client, collection_name, file_path) if os.path.exists(file_path) else []
+        # keyframe bị bớt đi trong lần cập nhật này
+        _delete_stale_points(shard_client, collection_name, "video_id", video_id, point_ids)
+    
+    for video_id in removed_video_ids:
+        shard_client, collection_name = shards[shard_for_video(video_id, len(shards))]
+        _delete_stale_points(shard_client, collection_name, "video_id", video_id)
 
 from sentence_transformers import SentenceTransformer
 
-def build_keyword_vector_store():
-    print("Bắt đầu xây dựng keyword vector store với Qdrant...")
+KEYWORD_EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
 
-    embedding_model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
-    vector_size = embedding_model.get_sentence_embedding_dimension()
-    client.recreate_collection(
-        collection_name=settings.QDRANT_KEYWORD_COLLECTION_NAME,
-        vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE),
-    )
-    print(f"-> Collection '{settings.QDRANT_KEYWORD_COLLECTION_NAME}' đã được tạo/tái tạo.")
+def _video_keywords(file_path):
+    """Distinct, stripped keywords of one metadata file"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    keywords = (keyword.strip() for keyword in data.get("keywords", []) if isinstance(keyword, str))
+    return set(filter(None, keywords))
+
+def _keyword_payload(keyword, video_ids):
+    video_ids = sorted(video_ids)
+    return {"keyword": keyword, "video_ids": video_ids, "video_count": len(video_ids)}
+
+def _encode_keywords(embedding_model, keywords):
+    return embedding_model.encode(
+        keywords,
+        batch_size=settings.KEYWORD_ENCODE_BATCH_SIZE,
+        convert_to_numpy=True,
+        show_progress_bar=len(keywords) > settings.KEYWORD_ENCODE_BATCH_SIZE
+    ).astype(np.float32)
+
+def build_keyword_vector_store(version=None, publish=True):
+    """One point per distinct keyword, listing every video that uses it.
+    
+    The vocabulary is collected from all metadata files first, so a keyword
+    shared by many videos is encoded and stored once. With publish=False
+    the alias is left alone until publish_keyword_vector_store(version).
+    """
+    print("Bắt đầu xây dựng keyword vector store với Qdrant...")
 
     metadata_files = glob.glob(os.path.join(settings.RAW_METADATA_DIR, "*.json"))
     if not metadata_files:
         print(f"LỖI: Không tìm thấy file .json nào trong thư mục: {settings.RAW_METADATA_DIR}")
         return
 
-    point_id_counter = 0
-    batch_size = 500
-    points_to_upload = set()
-
+    # keyword -> video ids; số video chính là reference count
+    vocabulary = {}
     for file_path in tqdm(metadata_files):
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
-            keywords = data.get("keywords", [])
-            for keyword in keywords:
-                embedding_vector = embedding_model.encode(keyword)
-
-                point = models.PointStruct(
-                    id=point_id_counter,
-                    vector=embedding_vector,
-                    payload={"keyword": keyword, "source_file": os.path.basename(file_path)}
-                )
-                points_to_upload.update(point)
-                point_id_counter += 1
-
-                if len(points_to_upload) >= batch_size:
-                    client.upsert(
-                        collection_name=settings.QDRANT_KEYWORD_COLLECTION_NAME,
-                        points=list(points_to_upload),
-                        wait=True
-                    )
-                    # print(f"-> Đã upload {len(points_to_upload)} điểm (batch).")
-                    points_to_upload = []
-
+            video_id = os.path.splitext(os.path.basename(file_path))[0]
+            for keyword in _video_keywords(file_path):
+                vocabulary.setdefault(keyword, set()).add(video_id)
         except Exception as e:
             print(f"CẢNH BÁO: Bỏ qua file {file_path} do lỗi: {e}")
             continue
 
-    if points_to_upload:
-        client.upsert(
-            collection_name=settings.QDRANT_KEYWORD_COLLECTION_NAME,
-            points=points_to_upload,
+    keywords = sorted(vocabulary)
+    references = sum(len(video_ids) for video_ids in vocabulary.values())
+    print(f"-> {len(keywords)} keyword phân biệt từ {references} lượt dùng")
+
+    embedding_model = SentenceTransformer(KEYWORD_EMBEDDING_MODEL)
+    vector_size = embedding_model.get_sentence_embedding_dimension()
+    version = version or new_build_version()
+    alias = settings.QDRANT_KEYWORD_COLLECTION_NAME
+    collection_name = versioned_collection_name(alias, version)
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE),
+        **bulk_load_config()
+    )
+    # cập nhật incremental tìm keyword theo video
+    client.create_payload_index(
+        collection_name=collection_name,
+        field_name="video_ids",
+        field_schema=models.PayloadSchemaType.KEYWORD
+    )
+    print(f"-> Collection '{collection_name}' đã được tạo.")
+
+    if keywords:
+        client.upload_collection(
+            collection_name=collection_name,
+            vectors=_encode_keywords(embedding_model, keywords),
+            ids=[stable_point_id(keyword) for keyword in keywords],
+            payload=[_keyword_payload(keyword, vocabulary[keyword]) for keyword in keywords],
+            batch_size=settings.INDEX_UPLOAD_BATCH_SIZE,
+            parallel=settings.INDEX_UPLOAD_PARALLEL,
+            wait=False
+        )
+    verify_point_count(client, collection_name, len(keywords))
+    restore_indexing(client, collection_name)
+
+    warm_collection(client, collection_name)
+    if publish:
+        publish_keyword_vector_store(version)
+    print("Hoàn tất upload tất cả keywords ✅")
+    return len(keywords)
+
+def publish_keyword_vector_store(version):
+    """Move the keyword alias to the collection built for version"""
+    alias = settings.QDRANT_KEYWORD_COLLECTION_NAME
+    collection_name = versioned_collection_name(alias, version)
+    if not client.collection_exists(collection_name):
+        print(f"CẢNH BÁO: Không có collection '{collection_name}', giữ nguyên alias '{alias}'.")
+        return
+    publish_collection(client, alias, collection_name)
+    gc_collection_versions(client, alias)
+
+def update_keyword_vector_store(video_ids, removed_video_ids=()):
+    """Apply changed and removed videos to the keyword points of the live collection.
+    
+    Only keywords the affected videos used before or use now are touched:
+    their video lists are rewritten, keywords left without videos are
+    deleted, and only keywords new to the collection are encoded.
+    """
+    alias = settings.QDRANT_KEYWORD_COLLECTION_NAME
+    collection_name = resolve_alias(client, alias) or alias
+    affected = set(video_ids) | set(removed_video_ids)
+    if not affected:
+        return
+
+    new_keywords = {}
+    for video_id in sorted(video_ids):
+        file_path = os.path.join(settings.RAW_METADATA_DIR, f"{video_id}.json")
+        new_keywords[video_id] = _video_keywords(file_path) if os.path.exists(file_path) else set()
+
+    # keyword mà các video này đang tham chiếu trong collection
+    current = {}
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=models.Filter(must=[
+                models.FieldCondition(key="video_ids", match=models.MatchAny(any=sorted(affected)))
+            ]),
+            limit=settings.INDEX_UPLOAD_BATCH_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False
+        )
+        current.update((point.payload["keyword"], set(point.payload["video_ids"])) for point in points)
+        if offset is None:
+            break
+
+    # keyword mới với các video này nhưng có thể đã có trong collection
+    added = set().union(*new_keywords.values()) - current.keys()
+    for start in range(0, len(added), settings.INDEX_UPLOAD_BATCH_SIZE):
+        batch = [stable_point_id(keyword) for keyword in sorted(added)[start:start + settings.INDEX_UPLOAD_BATCH_SIZE]]
+        for point in client.retrieve(collection_name=collection_name, ids=batch, with_payload=True):
+            current[point.payload["keyword"]] = set(point.payload["video_ids"])
+
+    to_encode, to_update, to_delete = [], {}, []
+    for keyword in current.keys() | added:
+        videos = (current.get(keyword, set()) - affected) | {
+            video_id for video_id, keywords in new_keywords.items() if keyword in keywords
+        }
+        if not videos:
+            to_delete.append(stable_point_id(keyword))
+        elif keyword not in current:
+            to_encode.append((keyword, videos))
+        elif videos != current[keyword]:
+            to_update[keyword] = videos
+
+    if to_encode:
+        embedding_model = SentenceTransformer(KEYWORD_EMBEDDING_MODEL)
+        vectors = _encode_keywords(embedding_model, [keyword for keyword, _ in to_encode])
+        for start in range(0, len(to_encode), settings.INDEX_UPLOAD_BATCH_SIZE):
+            batch = to_encode[start:start + settings.INDEX_UPLOAD_BATCH_SIZE]
+            client.upsert(
+                collection_name=collection_name,
+                points=models.Batch(
+                    ids=[stable_point_id(keyword) for keyword, _ in batch],
+                    vectors=vectors[start:start + len(batch)].tolist(),
+                    payloads=[_keyword_payload(keyword, videos) for keyword, videos in batch]
+                ),
+                wait=True
+            )
+
+    for keyword, videos in to_update.items():
+        client.overwrite_payload(
+            collection_name=collection_name,
+            payload=_keyword_payload(keyword, videos),
+            points=[stable_point_id(keyword)],
             wait=True
         )
-        # print(f"-> Đã upload {len(points_to_upload)} điểm (batch cuối).")
 
-    print("Hoàn tất upload tất cả keywords ✅")
\ No newline at end of file
+    if to_delete:
+        client.delete(
+            collection_name=collection_name,
+            points_selector=models.PointIdsList(points=to_delete),
+            wait=True
+        )
+    print(f"-> Keyword: {len(to_encode)} mới, {len(to_update)} cập nhật, {len(to_delete)} đã xoá")
@@ -0,0 +1,131 @@
+import os
+import glob
+import threading
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, Optional, Set
+from config.settings import settings
+
+# (source directory, glob pattern, how to get video_id from a path relative to the directory)
+SOURCES = {
+    "metadata": (lambda: settings.RAW_METADATA_DIR, "*.json", lambda rel: Path(rel).stem),
+    "keyframes": (lambda: settings.RAW_MAP_KEYFRAME_DIR, "**/*.csv", lambda rel: Path(rel).stem),
+    "objects": (lambda: settings.RAW_OBJECT_DIR, "**/*.json", lambda rel: Path(rel).parent.name),
+    "clip": (lambda: settings.RAW_CLIPFEATURE_DIR, "*.npy", lambda rel: Path(rel).stem),
+}
+
+def file_sha256(file_path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _write_json_atomic(path: Path, data: Dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def load_manifest(path: Optional[Path] = None) -> Optional[Dict]:
+    path = Path(path or settings.BUILD_MANIFEST_PATH)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest: Dict, path: Optional[Path] = None):
+    _write_json_atomic(Path(path or settings.BUILD_MANIFEST_PATH), manifest)
+
+def scan_sources(previous: Optional[Dict] = None) -> Dict:
+    """Size, mtime and sha256 of every raw file, keyed by "<source>/<relative path>".
+
+    Files whose size and mtime match the previous manifest reuse its hash,
+    so only new or touched files are read.
+    """
+    previous_files = (previous or {}).get("files", {})
+    files = {}
+    for source, (directory, pattern, video_of) in SOURCES.items():
+        root = Path(directory())
+        for file_path in glob.glob(str(root / pattern), recursive=True):
+            rel = Path(file_path).relative_to(root).as_posix()
+            key = f"{source}/{rel}"
+            stat = os.stat(file_path)
+            entry = {"video_id": video_of(rel), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+            old = previous_files.get(key)
+            if old and old["size"] == entry["size"] and old["mtime_ns"] == entry["mtime_ns"]:
+                entry["sha256"] = old["sha256"]
+            else:
+                entry["sha256"] = file_sha256(file_path)
+            files[key] = entry
+    return {"files": files}
+
+def diff_manifests(previous: Optional[Dict], current: Dict) -> Dict[str, Set[str]]:
+    """Videos whose source files were added, changed (content hash) or all removed"""
+    previous_files = (previous or {}).get("files", {})
+    current_files = current["files"]
+    previous_videos = {entry["video_id"] for entry in previous_files.values()}
+    current_videos = {entry["video_id"] for entry in current_files.values()}
+
+    touched = set()
+    for key in previous_files.keys() | current_files.keys():
+        old, new = previous_files.get(key), current_files.get(key)
+        if old is None or new is None or old["sha256"] != new["sha256"]:
+            touched.add((new or old)["video_id"])
+
+    return {
+        "added": current_videos - previous_videos,
+        "removed": previous_videos - current_videos,
+        "changed": (touched & current_videos) - (current_videos - previous_videos),
+    }
+
+class BuildCheckpoint:
+    """Progress of an incremental build, persisted after every committed batch.
+
+    An interrupted build reloads it and skips the videos each stage has
+    already committed; it is deleted once the build is published.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or settings.BUILD_STATE_PATH)
+        self.state = None
+        self._lock = threading.Lock()  # stages mark progress concurrently
+
+    def load(self) -> Optional[Dict]:
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        return self.state
+
+    def start(self, version: str, staging_db: Path, changes: Dict[str, Set[str]], manifest: Dict) -> Dict:
+        self.state = {
+            "version": version,
+            "staging_db": str(staging_db),
+            "changes": {kind: sorted(videos) for kind, videos in changes.items()},
+            "manifest": manifest,
+            "done": {},
+        }
+        self.save()
+        return self.state
+
+    def done(self, stage: str) -> Set[str]:
+        return set(self.state["done"].get(stage, []))
+
+    def mark_done(self, stage: str, video_ids):
+        with self._lock:
+            self.state["done"][stage] = sorted(self.done(stage) | set(video_ids))
+            _write_json_atomic(self.path, self.state)
+
+    def save(self):
+        with self._lock:
+            _write_json_atomic(self.path, self.state)
+
+    def clear(self):
+        if self.path.exists():
+            os.remove(self.path)
+        self.state = None
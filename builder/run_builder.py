@@ -1,18 +1,198 @@
+import argparse
+import shutil
+import time
+from pathlib import Path
 from builder import *
-    
-def main():
+from builder.scheduler import Stage, StageScheduler
+from builder.synthetic import generate_synthetic_dataset
+from builder.benchmark import BENCHMARK_STAGES
+from config.settings import settings
+from tools.shard_router import get_video_shards
+from tools.search_tuner import profile_search_params
+from builder.versioning import (
+    new_build_version,
+    staging_database_path,
+    publish_database,
+    gc_staging_databases
+)
+
+def main(full=False):
+    """Incremental build when a published build and its manifest exist, full rebuild otherwise"""
+    previous = load_manifest()
+    checkpoint = BuildCheckpoint()
+    db_exists = Path(settings.METADATA_KEYFRAME_OBJECT_DB_PATH).exists()
+    if not full and (checkpoint.load() is not None or (previous is not None and db_exists)):
+        incremental_build(previous, checkpoint)
+    else:
+        full_build(previous, checkpoint)
+
+def full_build(previous=None, checkpoint=None):
     print("===== BẮT ĐẦU QUÁ TRÌNH CHUẨN BỊ DỮ LIỆU =====")
-    
-    # build SQL database
-    build_metadata_database()
-    build_keyframes_database()
-    build_objects_database()
-    
-    # build vector database
-    build_clip_vector_store()
-    build_keyword_vector_store()
-    
+    version = new_build_version()
+    # scan trước khi build: file thay đổi trong lúc build sẽ được lần incremental sau xử lý
+    manifest = scan_sources(previous)
+
+    # SQL stages share the staging file (sqlite=1), loaded without journal or fsync
+    # and compacted by finalize; vector stores are built into versioned
+    # collections beside them and only wait for their own resources. Nothing is
+    # published until every build stage has succeeded, the database first.
+    db_path = staging_database_path(version)
+    gc_staging_databases()
+    StageScheduler([
+        Stage("metadata", lambda: build_metadata_database(db_path, bulk=True), resources=["sqlite"], unit="video"),
+        Stage("normalize", normalize_raw_data, unit="row"),
+        Stage("keyframes", lambda: build_keyframes_database(db_path, bulk=True),
+              after=["normalize"], resources=["sqlite"], unit="keyframe"),
+        Stage("objects", lambda: build_objects_database(db_path, bulk=True),
+              after=["normalize"], resources=["sqlite"], unit="row"),
+        Stage("indexes", lambda: build_database_indexes(db_path, bulk=True),
+              after=["metadata", "keyframes", "objects"], resources=["sqlite"]),
+        Stage("finalize", lambda: finalize_database(db_path), after=["indexes"], resources=["sqlite"], unit="byte"),
+        Stage("verify_plans", lambda: verify_query_plans(db_path), after=["finalize"], resources=["sqlite"]),
+        Stage("clip", lambda: build_clip_vector_store(version, publish=False), resources=["qdrant"], unit="vector"),
+        Stage("keywords", lambda: build_keyword_vector_store(version, publish=False),
+              resources=["qdrant", "model"], unit="keyword"),
+        Stage("publish_db", lambda: publish_database(db_path), after=["verify_plans", "clip", "keywords"]),
+        Stage("publish_clip", lambda: publish_clip_vector_store(version), after=["publish_db"]),
+        Stage("publish_keywords", lambda: publish_keyword_vector_store(version), after=["publish_db"]),
+    ], settings.BUILD_STAGE_LIMITS).run()
+
+    save_manifest(manifest)
+    (checkpoint or BuildCheckpoint()).clear()
     print("\n===== HOÀN TẤT QUÁ TRÌNH CHUẨN BỊ DỮ LIỆU =====")
 
+def _batches(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def incremental_build(previous, checkpoint):
+    """Rebuild only added, changed and removed videos, resuming an interrupted run.
+
+    SQL changes go into a copy of the served database that is swapped in
+    when complete; vectors are then upserted into the live collections
+    with stable point ids, so search never sees vectors of videos the
+    served database does not have yet. Every batch of BUILD_CHECKPOINT_VIDEOS is recorded
+    in the checkpoint once committed.
+    """
+    start_time = time.perf_counter()
+    state = checkpoint.state
+    if state is None:
+        print("===== BẮT ĐẦU BUILD INCREMENTAL =====")
+        current = scan_sources(previous)
+        changes = diff_manifests(previous, current)
+        print(f"-> {len(changes['added'])} video mới, {len(changes['changed'])} video thay đổi, "
+              f"{len(changes['removed'])} video bị xoá")
+        if not any(changes.values()):
+            print("-> Không có thay đổi, bỏ qua build.")
+            return
+
+        version = new_build_version()
+        staging_db = staging_database_path(version)
+        gc_staging_databases()
+        shutil.copy2(settings.METADATA_KEYFRAME_OBJECT_DB_PATH, staging_db)
+        state = checkpoint.start(version, staging_db, changes, current)
+    else:
+        print(f"===== TIẾP TỤC BUILD INCREMENTAL {state['version']} =====")
+        gc_staging_databases(exclude=state['staging_db'])
+
+    removed = set(state['changes']['removed'])
+    videos = sorted(set(state['changes']['added']) | set(state['changes']['changed']) | removed)
+    staging_db = Path(state['staging_db'])
+
+    # SQL: xoá rồi nạp lại từng batch video trên bản copy, publish khi xong hết
+    def update_database():
+        if checkpoint.done('publish_db'):
+            return 0
+        if not checkpoint.done('columnar'):
+            normalize_raw_data(set(videos) - removed, removed)
+            checkpoint.mark_done('columnar', ['store'])
+        pending = [video_id for video_id in videos if video_id not in checkpoint.done('sql')]
+        for batch in _batches(pending, settings.BUILD_CHECKPOINT_VIDEOS):
+            delete_videos(staging_db, batch)
+            ingest = set(batch) - removed
+            if ingest:
+                build_metadata_database(staging_db, ingest)
+                build_keyframes_database(staging_db, ingest)
+                build_objects_database(staging_db, ingest)
+            checkpoint.mark_done('sql', batch)
+
+        build_database_indexes(staging_db)
+        verify_query_plans(staging_db)
+        publish_database(staging_db)
+        checkpoint.mark_done('publish_db', ['database'])
+        return len(pending)
+
+    # vector: upsert tại chỗ theo point id cố định
+    def update_vectors(stage, update):
+        pending = [video_id for video_id in videos if video_id not in checkpoint.done(stage)]
+        for batch in _batches(pending, settings.BUILD_CHECKPOINT_VIDEOS):
+            update(set(batch) - removed, set(batch) & removed)
+            checkpoint.mark_done(stage, batch)
+        return len(pending)
+
+    StageScheduler([
+        Stage("sql", update_database, resources=["sqlite"], unit="video"),
+        Stage("clip", lambda: update_vectors('clip', update_clip_vector_store),
+              after=["sql"], resources=["qdrant"], unit="video"),
+        Stage("keywords", lambda: update_vectors('keywords', update_keyword_vector_store),
+              after=["sql"], resources=["qdrant", "model"], unit="video"),
+    ], settings.BUILD_STAGE_LIMITS).run()
+
+    save_manifest(state['manifest'])
+    checkpoint.clear()
+    print(f"\n===== HOÀN TẤT BUILD INCREMENTAL: {len(videos)} video trong "
+          f"{time.perf_counter() - start_time:.1f}s =====")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build, export and restore search data")
+    subparsers = parser.add_subparsers(dest="command")
+
+    build_parser = subparsers.add_parser("build", help="Build databases from raw data (default)")
+    build_parser.add_argument("--full", action="store_true",
+                              help="Rebuild everything instead of only added/changed/removed videos")
+
+    export_parser = subparsers.add_parser("export-snapshot", help="Export a versioned snapshot bundle")
+    export_parser.add_argument("--output", default=None, help="Directory to write the bundle into")
+
+    restore_parser = subparsers.add_parser("restore-snapshot", help="Restore a snapshot bundle on this node")
+    restore_parser.add_argument("bundle", help="Path to the bundle directory (contains manifest.json)")
+
+    subparsers.add_parser("profile-search", help="Profile hnsw_ef/limit recall vs latency on every keyframe shard")
+
+    def add_dataset_args(subparser):
+        subparser.add_argument("--videos", type=int, default=100)
+        subparser.add_argument("--keyframes", type=int, default=200, help="Keyframes per video")
+        subparser.add_argument("--detections", type=int, default=8, help="Mean detections per keyframe")
+        subparser.add_argument("--dim", type=int, default=512, help="CLIP vector dimension")
+        subparser.add_argument("--seed", type=int, default=0)
+
+    synthetic_parser = subparsers.add_parser("generate-synthetic", help="Write a synthetic raw dataset")
+    synthetic_parser.add_argument("output", help="Directory to write media-info, map-keyframes, objects, clip-features-32 into")
+    add_dataset_args(synthetic_parser)
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="Time each builder stage on a synthetic dataset")
+    benchmark_parser.add_argument("--output", default=None, help="Working directory (temporary by default)")
+    benchmark_parser.add_argument("--data", default=None, help="Reuse a dataset from generate-synthetic")
+    benchmark_parser.add_argument("--stages", nargs="+", choices=BENCHMARK_STAGES, default=None)
+    add_dataset_args(benchmark_parser)
+
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+
+    if args.command == "export-snapshot":
+        export_snapshot_bundle(args.output)
+    elif args.command == "restore-snapshot":
+        restore_snapshot_bundle(args.bundle)
+    elif args.command == "generate-synthetic":
+        generate_synthetic_dataset(args.output, args.videos, args.keyframes, args.detections, args.dim, seed=args.seed)
+    elif args.command == "benchmark":
+        from builder.benchmark import run_benchmark
+        run_benchmark(args.output, args.videos, args.keyframes, args.detections, args.dim,
+                      seed=args.seed, stages=args.stages, data_dir=args.data)
+    elif args.command == "profile-search":
+        entries = profile_search_params(get_video_shards())
+        print(f"-> Đã profile {len(entries)} cấu hình, lưu vào {settings.SEARCH_PROFILE_PATH}")
+    else:
+        main(full=getattr(args, "full", False))
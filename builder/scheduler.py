@@ -0,0 +1,158 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+@dataclass
+class Stage:
+    """One build step: runs once every stage in `after` has succeeded.
+
+    `resources` names the limited resources it holds while running (see
+    StageScheduler). If `run` returns an int it is reported as the number
+    of `unit` processed.
+    """
+    name: str
+    run: Callable[[], Optional[int]]
+    after: List[str] = field(default_factory=list)
+    resources: List[str] = field(default_factory=list)
+    unit: str = "item"
+    status: str = "pending"  # pending, running, done, failed, skipped
+    seconds: float = 0.0
+    items: Optional[int] = None
+    error: Optional[BaseException] = None
+
+class StageFailed(RuntimeError):
+    pass
+
+class StageScheduler:
+    """Runs a DAG of stages on threads, as many at once as dependencies and resources allow.
+
+    `limits` caps how many running stages may hold each resource, e.g.
+    {"sqlite": 1} keeps writers of the same database file serialized while
+    vector uploads run beside them. On the first failure no new stage is
+    started; running stages finish, the rest are skipped and StageFailed
+    is raised after the summary is printed.
+    """
+
+    def __init__(self, stages: List[Stage], limits: Optional[Dict[str, int]] = None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.limits = dict(limits or {})
+        self._in_use = {resource: 0 for resource in self.limits}
+        self._validate()
+
+    def _validate(self):
+        for stage in self.stages.values():
+            unknown = [name for name in stage.after if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages {unknown}")
+
+        # Kahn: every stage must be reachable without a cycle
+        remaining = {name: set(stage.after) for name, stage in self.stages.items()}
+        while remaining:
+            ready = [name for name, after in remaining.items() if not after]
+            if not ready:
+                raise ValueError(f"Stage dependencies form a cycle: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for after in remaining.values():
+                after.difference_update(ready)
+
+    def _ready(self) -> List[Stage]:
+        ready = []
+        for stage in self.stages.values():
+            if stage.status != "pending":
+                continue
+            if all(self.stages[name].status == "done" for name in stage.after):
+                ready.append(stage)
+        return ready
+
+    def _acquire(self, stage: Stage) -> bool:
+        if any(self._in_use.get(r, 0) >= self.limits[r] for r in stage.resources if r in self.limits):
+            return False
+        for resource in stage.resources:
+            if resource in self.limits:
+                self._in_use[resource] += 1
+        return True
+
+    def _release(self, stage: Stage):
+        for resource in stage.resources:
+            if resource in self.limits:
+                self._in_use[resource] -= 1
+
+    def _execute(self, stage: Stage):
+        start_time = time.perf_counter()
+        try:
+            result = stage.run()
+            stage.items = result if isinstance(result, int) else None
+            stage.status = "done"
+        except BaseException as e:
+            stage.error = e
+            stage.status = "failed"
+        finally:
+            stage.seconds = time.perf_counter() - start_time
+
+    def run(self) -> Dict[str, Stage]:
+        start_time = time.perf_counter()
+        running = {}
+        failed = False
+
+        with ThreadPoolExecutor(max_workers=max(1, len(self.stages))) as executor:
+            while True:
+                if not failed:
+                    for stage in self._ready():
+                        if not self._acquire(stage):
+                            continue
+                        stage.status = "running"
+                        print(f"[stage] ▶ {stage.name}")
+                        running[executor.submit(self._execute, stage)] = stage
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    self._release(stage)
+                    print(f"[stage] {'✔' if stage.status == 'done' else '✘'} {stage.name} "
+                          f"({stage.seconds:.1f}s)")
+                    if stage.status == "failed":
+                        failed = True
+
+        for stage in self.stages.values():
+            if stage.status == "pending":
+                stage.status = "skipped"
+
+        self.print_summary(time.perf_counter() - start_time)
+        errors = [stage for stage in self.stages.values() if stage.status == "failed"]
+        if errors:
+            messages = "; ".join(f"{stage.name}: {stage.error!r}" for stage in errors)
+            raise StageFailed(f"Build failed at {messages}") from errors[0].error
+        return self.stages
+
+    def critical_path(self) -> Tuple[List[str], float]:
+        """Slowest dependency chain of the last run and its total wall time"""
+        memo = {}
+
+        def chain(name):
+            if name not in memo:
+                stage = self.stages[name]
+                best = max((chain(after) for after in stage.after), key=lambda c: c[1], default=([], 0.0))
+                memo[name] = (best[0] + [name], best[1] + stage.seconds)
+            return memo[name]
+
+        return max((chain(name) for name in self.stages), key=lambda c: c[1], default=([], 0.0))
+
+    def print_summary(self, wall_seconds: float):
+        print("\n===== TỔNG KẾT CÁC STAGE =====")
+        for stage in self.stages.values():
+            line = f"{stage.name:<16} {stage.status:<8} {stage.seconds:8.1f}s"
+            if stage.items is not None:
+                line += f"  {stage.items} {stage.unit} ({stage.items / max(stage.seconds, 1e-6):,.0f} {stage.unit}/s)"
+            if stage.error is not None:
+                line += f"  {stage.error!r}"
+            print(line)
+
+        path, path_seconds = self.critical_path()
+        total_seconds = sum(stage.seconds for stage in self.stages.values())
+        print(f"-> Wall time {wall_seconds:.1f}s (tổng các stage {total_seconds:.1f}s, "
+              f"chuỗi dài nhất {' → '.join(path)} {path_seconds:.1f}s)")
@@ -0,0 +1,239 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait
+import httpx
+from config.settings import settings
+from .index_builder import client
+from .versioning import (
+    new_build_version,
+    resolve_alias,
+    versioned_collection_name,
+    warm_collection,
+    publish_collection,
+    gc_collection_versions
+)
+from tqdm import tqdm
+from tools.shard_router import shard_collection_names
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_FORMAT_VERSION = 1
+
+def _qdrant_url(path: str) -> str:
+    return f"http://{settings.QDRANT_HOST}:{settings.QDRANT_PORT}{path}"
+
+def _chunk_ranges(size: int, chunk_size: int):
+    return [(offset, min(chunk_size, size - offset)) for offset in range(0, size, chunk_size)] or [(0, 0)]
+
+def _file_sha256(file_path: Path, chunk_size: int) -> str:
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+def _describe_file(file_path: Path, chunk_size: int) -> dict:
+    """Size, whole-file sha256 and per-chunk sha256 of a bundle file"""
+    file_hash = hashlib.sha256()
+    chunk_hashes = []
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            file_hash.update(chunk)
+            chunk_hashes.append(hashlib.sha256(chunk).hexdigest())
+    return {
+        "size": file_path.stat().st_size,
+        "sha256": file_hash.hexdigest(),
+        "chunks": chunk_hashes or [hashlib.sha256(b"").hexdigest()]
+    }
+
+def _download_collection_snapshot(alias: str, output_dir: Path) -> Path:
+    """Create a Qdrant snapshot of the collection behind an alias and stream it into the bundle"""
+    collection_name = resolve_alias(client, alias) or alias
+    snapshot = client.create_snapshot(collection_name=collection_name, wait=True)
+    target = output_dir / f"{alias}.snapshot"
+
+    url = _qdrant_url(f"/collections/{collection_name}/snapshots/{snapshot.name}")
+    with httpx.stream("GET", url, timeout=None) as response:
+        response.raise_for_status()
+        with open(target, "wb") as f:
+            for data in response.iter_bytes(chunk_size=1024 * 1024):
+                f.write(data)
+
+    # snapshot đã nằm trong bundle, xoá bản trên server để không chiếm dung lượng
+    client.delete_snapshot(collection_name=collection_name, snapshot_name=snapshot.name)
+    return target
+
+def _compact_database(output_dir: Path) -> Path:
+    """Write a defragmented copy of the metadata database into the bundle"""
+    target = output_dir / Path(settings.METADATA_KEYFRAME_OBJECT_DB_PATH).name
+    conn = sqlite3.connect(settings.METADATA_KEYFRAME_OBJECT_DB_PATH)
+    try:
+        conn.execute("VACUUM INTO ?", (str(target),))
+    finally:
+        conn.close()
+    return target
+
+def export_snapshot_bundle(output_root: Path = None) -> Path:
+    """Export Qdrant collections and the SQLite database as a versioned bundle"""
+    print("Bắt đầu export snapshot bundle...")
+    output_root = Path(output_root or settings.SNAPSHOT_DIR)
+    bundle_version = new_build_version()
+    output_dir = output_root / bundle_version
+    output_dir.mkdir(parents=True, exist_ok=False)
+
+    chunk_size = settings.SNAPSHOT_CHUNK_SIZE
+    entries = []
+
+    db_file = _compact_database(output_dir)
+    entries.append({"name": db_file.name, "kind": "sqlite", **_describe_file(db_file, chunk_size)})
+    print(f"-> Đã nén database vào {db_file.name}")
+
+    # với shard theo endpoint, mỗi node export collection (shard) của chính nó
+    video_collections = shard_collection_names(settings.QDRANT_VIDEO_COLLECTION_NAME, settings.QDRANT_SHARD_COUNT)
+    for collection_name in video_collections + [settings.QDRANT_KEYWORD_COLLECTION_NAME]:
+        snapshot_file = _download_collection_snapshot(collection_name, output_dir)
+        entries.append({
+            "name": snapshot_file.name,
+            "kind": "qdrant_snapshot",
+            "collection": collection_name,
+            **_describe_file(snapshot_file, chunk_size)
+        })
+        print(f"-> Đã tạo snapshot cho collection '{collection_name}'")
+
+    manifest = {
+        "format_version": MANIFEST_FORMAT_VERSION,
+        "bundle_version": bundle_version,
+        "created_at": datetime.now().isoformat(),
+        "chunk_size": chunk_size,
+        "files": entries
+    }
+    with open(output_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"-> Snapshot bundle đã được export vào {output_dir} ✅")
+    return output_dir
+
+def _copy_chunk(handles, offset: int, length: int, expected_sha256: str):
+    src_file, dst_file = handles
+    src_file.seek(offset)
+    data = src_file.read(length)
+    if len(data) != length or hashlib.sha256(data).hexdigest() != expected_sha256:
+        raise ValueError(f"checksum mismatch at offset {offset}")
+    dst_file.seek(offset)
+    dst_file.write(data)
+    return length
+
+def _parallel_copy(src: Path, dst: Path, entry: dict, chunk_size: int, executor: ThreadPoolExecutor, progress: tqdm):
+    """Copy a file in parallel chunks, validating each chunk against the manifest"""
+    ranges = _chunk_ranges(entry["size"], chunk_size)
+    if len(ranges) != len(entry["chunks"]):
+        raise ValueError(f"{src.name}: manifest chunk count does not match file size")
+
+    with open(dst, "wb") as f:
+        f.truncate(entry["size"])
+
+    # mỗi worker thread một cặp file handle riêng: seek + read/write không tranh vị trí
+    local = threading.local()
+    opened = []
+    opened_lock = threading.Lock()
+
+    def copy_chunk(offset, length, chunk_sha):
+        if not hasattr(local, "handles"):
+            local.handles = (open(src, "rb"), open(dst, "r+b"))
+            with opened_lock:
+                opened.append(local.handles)
+        return _copy_chunk(local.handles, offset, length, chunk_sha)
+
+    futures = [
+        executor.submit(copy_chunk, offset, length, chunk_sha)
+        for (offset, length), chunk_sha in zip(ranges, entry["chunks"])
+    ]
+    try:
+        for future in futures:
+            progress.update(future.result())
+    finally:
+        # chunk lỗi: huỷ chunk chưa chạy, đợi chunk đang chạy rồi mới đóng handle
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        for src_file, dst_file in opened:
+            src_file.close()
+            dst_file.close()
+
+    with open(dst, "rb+") as f:
+        os.fsync(f.fileno())
+
+    # chunk đúng chưa đủ: kiểm tra cả file đã ghép (thứ tự, độ dài, manifest bị sửa)
+    if _file_sha256(dst, chunk_size) != entry["sha256"]:
+        raise ValueError(f"{src.name}: whole-file checksum mismatch")
+
+def _upload_collection_snapshot(alias: str, version: str, snapshot_file: Path) -> str:
+    """Recover a versioned collection on this node from a snapshot file, without publishing it"""
+    collection_name = versioned_collection_name(alias, version)
+    url = _qdrant_url(f"/collections/{collection_name}/snapshots/upload")
+    with open(snapshot_file, "rb") as f:
+        response = httpx.post(
+            url,
+            params={"priority": "snapshot", "wait": "true"},
+            files={"snapshot": (snapshot_file.name, f, "application/octet-stream")},
+            timeout=None
+        )
+    response.raise_for_status()
+    warm_collection(client, collection_name)
+    return collection_name
+
+def restore_snapshot_bundle(bundle_dir: Path) -> str:
+    """Restore a snapshot bundle from a local path onto this node"""
+    bundle_dir = Path(bundle_dir)
+    print(f"Bắt đầu restore snapshot bundle từ {bundle_dir}...")
+    with open(bundle_dir / MANIFEST_NAME, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != MANIFEST_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot bundle format: {manifest.get('format_version')}")
+
+    chunk_size = manifest["chunk_size"]
+    staging_dir = Path(settings.SNAPSHOT_DIR) / f"restore_{manifest['bundle_version']}"
+    staging_dir.mkdir(parents=True, exist_ok=True)
+
+    # copy + validate toàn bộ file trước khi động vào dữ liệu đang chạy
+    total_bytes = sum(entry["size"] for entry in manifest["files"])
+    with ThreadPoolExecutor(max_workers=settings.SNAPSHOT_TRANSFER_WORKERS) as executor, \
+            tqdm(total=total_bytes, unit="B", unit_scale=True) as progress:
+        for entry in manifest["files"]:
+            _parallel_copy(bundle_dir / entry["name"], staging_dir / entry["name"], entry, chunk_size, executor, progress)
+
+    print("-> Checksum hợp lệ cho tất cả file trong bundle")
+
+    # khôi phục và kiểm tra mọi collection trước, rồi mới chuyển alias và database
+    restored = []
+    for entry in manifest["files"]:
+        if entry["kind"] == "qdrant_snapshot":
+            collection_name = _upload_collection_snapshot(
+                entry["collection"], manifest["bundle_version"], staging_dir / entry["name"]
+            )
+            restored.append((entry["collection"], collection_name))
+            print(f"-> Đã khôi phục collection '{entry['collection']}'")
+
+    for alias, collection_name in restored:
+        publish_collection(client, alias, collection_name)
+        gc_collection_versions(client, alias)
+
+    for entry in manifest["files"]:
+        if entry["kind"] == "sqlite":
+            db_path = Path(settings.METADATA_KEYFRAME_OBJECT_DB_PATH)
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staging_dir / entry["name"], db_path)
+            print(f"-> Đã khôi phục database vào {db_path}")
+
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    print(f"-> Restore snapshot bundle {manifest['bundle_version']} thành công ✅")
+    return manifest["bundle_version"]
@@ -0,0 +1,115 @@
+import os
+import csv
+import json
+from pathlib import Path
+import numpy as np
+from tqdm import tqdm
+
+# Open Images classes, the vocabulary of the real detector output
+OBJECT_CLASSES = [
+    "Person", "Man", "Woman", "Boy", "Girl", "Human face", "Clothing", "Car", "Motorcycle", "Bicycle",
+    "Bus", "Truck", "Building", "Tree", "House", "Window", "Door", "Street light", "Traffic sign", "Flag",
+    "Boat", "Dog", "Cat", "Bird", "Table", "Chair", "Microphone", "Television", "Mobile phone", "Food",
+]
+
+KEYWORD_WORDS = [
+    "tin tức", "thời sự", "giao thông", "thời tiết", "kinh tế", "thể thao", "bóng đá", "du lịch", "văn hoá",
+    "giáo dục", "y tế", "công nghệ", "nông nghiệp", "biển", "lũ lụt", "hà nội", "sài gòn", "đà nẵng",
+    "60 giây", "htv", "vtv", "tết", "lễ hội", "chứng khoán", "bất động sản", "môi trường", "an ninh",
+]
+
+def synthetic_video_ids(videos: int, videos_per_batch: int = 30):
+    """L01_V001, L01_V002, ... in the layout of the competition batches"""
+    return [f"L{i // videos_per_batch + 1:02d}_V{i % videos_per_batch + 1:03d}" for i in range(videos)]
+
+def _write_metadata(directory: Path, video_id: str, keyframes: int, rng: np.random.Generator, vocabulary):
+    keywords = list(rng.choice(vocabulary, size=int(rng.integers(3, 12)), replace=False))
+    day, month = int(rng.integers(1, 29)), int(rng.integers(1, 13))
+    data = {
+        "author": f"Kênh {int(rng.integers(1, 50))}",
+        "channel_id": f"UC{video_id}",
+        "channel_url": f"https://www.youtube.com/channel/UC{video_id}",
+        "description": " ".join(rng.choice(vocabulary, size=20)),
+        "keywords": keywords,
+        "length": keyframes * 4,
+        "publish_date": f"{day:02d}/{month:02d}/2024",
+        "thumbnail_url": f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+        "title": f"{keywords[0]} {video_id}",
+        "watch_url": f"https://youtube.com/watch?v={video_id}",
+    }
+    with open(directory / f"{video_id}.json", "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+def _write_map_keyframes(directory: Path, video_id: str, keyframes: int, rng: np.random.Generator):
+    fps = 25.0
+    frame_idx = np.sort(rng.choice(keyframes * 100, size=keyframes, replace=False))
+    with open(directory / f"{video_id}.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["n", "pts_time", "fps", "frame_idx"])
+        for n, frame in enumerate(frame_idx, start=1):
+            writer.writerow([n, round(frame / fps, 2), fps, int(frame)])
+
+def _write_objects(directory: Path, video_id: str, keyframes: int, detections: int, rng: np.random.Generator):
+    video_dir = directory / video_id
+    video_dir.mkdir(parents=True, exist_ok=True)
+    for n in range(1, keyframes + 1):
+        count = int(rng.poisson(detections))
+        classes = rng.choice(len(OBJECT_CLASSES), size=count)
+        corners = rng.random((count, 2, 2))  # two (y, x) corners per box
+        mins, maxs = corners.min(axis=1), corners.max(axis=1)
+        boxes = np.concatenate([mins, maxs], axis=1)  # ymin, xmin, ymax, xmax
+        data = {
+            "detection_scores": rng.random(count).round(4).tolist(),
+            "detection_class_names": [f"/m/{c:05d}" for c in classes],
+            "detection_class_entities": [OBJECT_CLASSES[c] for c in classes],
+            "detection_class_labels": (classes + 1).tolist(),
+            "detection_boxes": boxes.round(4).tolist(),
+        }
+        with open(video_dir / f"{n:03d}.json", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+def _write_clip_features(directory: Path, video_id: str, keyframes: int, dim: int, rng: np.random.Generator):
+    vectors = rng.standard_normal((keyframes, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.save(directory / f"{video_id}.npy", vectors)
+
+def generate_synthetic_dataset(output_dir, videos: int = 100, keyframes: int = 200, detections: int = 8,
+                               dim: int = 512, keywords: int = 2000, seed: int = 0) -> dict:
+    """Write a random raw dataset in the layout the builder reads from RAW_DATA.
+
+    `keyframes` is per video and `detections` the mean per keyframe; keywords
+    are drawn from a vocabulary of `keywords` distinct words so they repeat
+    across videos like real ones. The same seed gives the same dataset.
+    """
+    root = Path(output_dir)
+    directories = {
+        "metadata": root / "media-info",
+        "keyframes": root / "map-keyframes",
+        "objects": root / "objects",
+        "clip": root / "clip-features-32",
+    }
+    for directory in directories.values():
+        directory.mkdir(parents=True, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    extra = rng.choice(KEYWORD_WORDS, size=max(0, keywords - len(KEYWORD_WORDS)))
+    vocabulary = KEYWORD_WORDS + [f"{word} {i}" for i, word in enumerate(extra)]
+
+    print(f"Bắt đầu sinh dữ liệu giả lập: {videos} video x {keyframes} keyframe vào {root}")
+    video_ids = synthetic_video_ids(videos)
+    for video_id in tqdm(video_ids):
+        _write_metadata(directories["metadata"], video_id, keyframes, rng, vocabulary)
+        _write_map_keyframes(directories["keyframes"], video_id, keyframes, rng)
+        _write_objects(directories["objects"], video_id, keyframes, detections, rng)
+        _write_clip_features(directories["clip"], video_id, keyframes, dim, rng)
+
+    summary = {
+        "root": str(root),
+        "videos": videos,
+        "keyframes": videos * keyframes,
+        "mean_detections": detections,
+        "dim": dim,
+        "bytes": sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files),
+    }
+    print(f"-> Đã sinh {summary['keyframes']} keyframe, {summary['bytes'] / 2**20:.1f}MB")
+    return summary
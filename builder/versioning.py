@@ -0,0 +1,128 @@
+import os
+import glob
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from qdrant_client import QdrantClient, models
+from config.settings import settings
+
+VERSION_SEPARATOR = "__"
+
+def new_build_version() -> str:
+    return datetime.now().strftime("v%Y%m%d%H%M%S")
+
+def versioned_collection_name(alias: str, version: str) -> str:
+    return f"{alias}{VERSION_SEPARATOR}{version}"
+
+def resolve_alias(client: QdrantClient, alias: str) -> Optional[str]:
+    """Return the collection currently served under an alias"""
+    for description in client.get_aliases().aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+def warm_collection(client: QdrantClient, collection_name: str, timeout: float = None):
+    """Wait for indexing to finish and touch the index before it takes traffic.
+
+    Raises if the collection turns RED or is not GREEN within the timeout.
+    """
+    timeout = settings.INDEX_WARMUP_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get_collection(collection_name).status
+        if status == models.CollectionStatus.GREEN:
+            break
+        if status == models.CollectionStatus.RED:
+            raise RuntimeError(f"Collection '{collection_name}' failed to optimize (status RED)")
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"Collection '{collection_name}' still {status} after {timeout:.0f}s")
+        time.sleep(1)
+
+    sample_points, _ = client.scroll(
+        collection_name=collection_name,
+        limit=settings.INDEX_WARMUP_QUERIES,
+        with_vectors=True,
+        with_payload=False
+    )
+    for point in sample_points:
+        client.search(collection_name=collection_name, query_vector=point.vector, limit=10)
+
+def publish_collection(client: QdrantClient, alias: str, collection_name: str):
+    """Atomically point the alias read by QdrantTool at a freshly built collection"""
+    operations = []
+    if resolve_alias(client, alias) is not None:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)))
+    elif alias in [c.name for c in client.get_collections().collections]:
+        # collection cũ được tạo trước khi có alias, phải xoá để alias có thể dùng tên này
+        print(f"CẢNH BÁO: Xoá collection cũ '{alias}' để chuyển sang alias.")
+        client.delete_collection(collection_name=alias)
+
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=collection_name, alias_name=alias)
+    ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    print(f"-> Alias '{alias}' đã chuyển sang '{collection_name}'")
+
+def gc_collection_versions(client: QdrantClient, alias: str, keep: int = None):
+    """Drop old versions of a collection, keeping the live one and `keep` previous ones"""
+    keep = settings.INDEX_VERSIONS_TO_KEEP if keep is None else keep
+    live = resolve_alias(client, alias)
+    prefix = f"{alias}{VERSION_SEPARATOR}"
+    versions = sorted(
+        (c.name for c in client.get_collections().collections if c.name.startswith(prefix) and c.name != live),
+        reverse=True
+    )
+    for collection_name in versions[keep:]:
+        client.delete_collection(collection_name=collection_name)
+        print(f"-> Đã xoá collection cũ '{collection_name}'")
+
+def staging_database_path(version: str) -> Path:
+    db_path = Path(settings.METADATA_KEYFRAME_OBJECT_DB_PATH)
+    return db_path.with_name(f"{db_path.stem}.{version}.building{db_path.suffix}")
+
+def publish_database(staging_path: Path):
+    """Atomically replace the served database file with a freshly built one"""
+    db_path = Path(settings.METADATA_KEYFRAME_OBJECT_DB_PATH)
+    with open(staging_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(staging_path, db_path)
+    print(f"-> Database đã được chuyển sang bản mới: {db_path}")
+
+def gc_staging_databases(exclude: Path = None):
+    """Remove staging files left behind by interrupted builds"""
+    db_path = Path(settings.METADATA_KEYFRAME_OBJECT_DB_PATH)
+    pattern = str(db_path.with_name(f"{db_path.stem}.*.building{db_path.suffix}"))
+    for file_path in glob.glob(pattern):
+        if exclude is not None and Path(file_path) == Path(exclude):
+            continue
+        for leftover in glob.glob(f"{file_path}*"):
+            os.remove(leftover)
+        print(f"-> Đã xoá file build dở dang: {file_path}")
+
+def bulk_load_config() -> dict:
+    """create_collection arguments that defer HNSW building until the load is done"""
+    return {
+        "hnsw_config": models.HnswConfigDiff(m=0),
+        "optimizers_config": models.OptimizersConfigDiff(indexing_threshold=0),
+    }
+
+def restore_indexing(client: QdrantClient, collection_name: str):
+    """Turn HNSW back on after a bulk load; the index is then built once over all points"""
+    client.update_collection(
+        collection_name=collection_name,
+        hnsw_config=models.HnswConfigDiff(m=settings.INDEX_HNSW_M),
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=settings.INDEX_INDEXING_THRESHOLD),
+    )
+
+def verify_point_count(client: QdrantClient, collection_name: str, expected: int, timeout: float = None):
+    """Wait until every point uploaded without wait=True has landed, or raise"""
+    timeout = settings.INDEX_VERIFY_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    while True:
+        count = client.count(collection_name=collection_name, exact=True).count
+        if count == expected:
+            return count
+        if count > expected or time.monotonic() >= deadline:
+            raise RuntimeError(f"Collection '{collection_name}' has {count} points, expected {expected}")
+        time.sleep(1)
@@ -74,7 +74,8 @@ JSON format:
     "object_search": {
         "object_names": ["person", "knife", "food"], // Danh sách tên đối tượng cần tìm
         "confidence_threshold": 0.6, // Ngưỡng tin cậy tối thiểu cho đối tượng được phát hiện
-        "required_objects": ["person"] // Danh sách các đối tượng BẮT BUỘC phải có trong kết quả
+        "required_objects": ["person"], // Danh sách các đối tượng BẮT BUỘC phải có trong kết quả
+        "object_counts": {} // Số lượng đối tượng trong một keyframe, ví dụ {"person": 3, "motorbike": ">=2"}
     },
     "filters": {
         "author": null, // Lọc theo tác giả (ví dụ: "Nguyễn Văn A")
@@ -124,7 +125,8 @@ Trả về JSON format:
     "search_params": {
         "similarity_threshold": 0.7,
         "max_results": 100,
-        "diversity_filter": true
+        "diversity_filter": true,
+        "result_mode": "keyframe" // "keyframe": trả về từng keyframe, "video": mỗi video một kết quả
     },
     "metadata_filters": {
         "video_ids": null,
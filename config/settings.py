@@ -2,7 +2,7 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 from pydantic_settings import BaseSettings
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any
 
 load_dotenv()
 
@@ -29,12 +29,105 @@ class Settings(BaseSettings):
     RAW_OBJECT_DIR: Path = RAW_DATA / "objects"
     RAW_CLIPFEATURE_DIR: Path = RAW_DATA / "clip-features-32"
     RAW_METADATA_DIR: Path = RAW_DATA / "media-info"
+    CLIP_VECTOR_SIZE: int = 512
     
     QDRANT_HOST: str = "127.0.0.1"
     QDRANT_PORT: int = 6333
     QDRANT_VIDEO_COLLECTION_NAME: str = "video_collection"
     QDRANT_KEYWORD_COLLECTION_NAME: str = "keyword_collection"
     
+    # Keyframe sharding: either QDRANT_SHARD_COUNT collections on QDRANT_HOST,
+    # or one collection per "host:port" in QDRANT_SHARD_ENDPOINTS
+    QDRANT_SHARD_COUNT: int = 1
+    QDRANT_SHARD_STRATEGY: str = "batch"  # "batch" (L01, L02, ...) or "hash"
+    QDRANT_SHARD_ENDPOINTS: List[str] = []
+    QDRANT_SHARD_TIMEOUT: float = 2.0  # seconds per shard search
+    
+    # SQLite read connections (pooled per thread, read-only)
+    SQLITE_PRAGMAS: Dict[str, Any] = {
+        "query_only": "ON",
+        "mmap_size": 268435456,  # 256MB
+        "cache_size": -65536,  # 64MB
+        "temp_store": "MEMORY"
+    }
+    SQLITE_STATEMENT_CACHE_SIZE: int = 256
+    SQLITE_READER_THREADS: int = 4  # async agents' reader pool = number of pooled connections
+    SQLITE_QUERY_STATS: bool = True  # per-template timing histograms
+    SQLITE_SLOW_QUERY_MS: float = 50.0  # slower queries are logged with EXPLAIN QUERY PLAN
+    SQLITE_IN_MEMORY: bool = False  # serve reads from an in-memory copy of the database
+    SQLITE_IN_MEMORY_MAX_BYTES: int = 4 * 1024 * 1024 * 1024  # larger files stay on disk
+    
+    # Results per source and per page; pushed down into SQL as LIMIT
+    SEARCH_TOP_K: int = 50
+    
+    # In-memory object index (class -> sorted keyframe ordinals) for object queries
+    OBJECT_INDEX_ENABLED: bool = True
+    OBJECT_INDEX_MIN_CONFIDENCE: float = 0.1  # weaker detections are not indexed
+    OBJECT_COUNT_MIN_CONFIDENCE: float = 0.5  # detections counted in keyframe_object_counts
+    
+    # BM25 column weights for metadata full-text search
+    METADATA_FTS_WEIGHTS: Dict[str, float] = {
+        "title": 10.0,
+        "description": 2.0,
+        "keywords": 5.0,
+        "author": 3.0
+    }
+    
+    # Visual search grouping (server-side diversity per video)
+    VISUAL_GROUP_LIMIT: int = 20  # number of distinct videos per search
+    VISUAL_GROUP_SIZE: int = 5  # keyframes kept per video
+    
+    # Adaptive HNSW search params (profile with `run_builder.py profile-search`)
+    VISUAL_SIMILARITY_THRESHOLD: float = 0.05
+    VISUAL_SEARCH_LATENCY_BUDGET_MS: float = 50.0
+    SEARCH_PROFILE_PATH: Path = BASE_DIR / "data" / "processed_data" / "search_profile.json"
+    SEARCH_PROFILE_EF_VALUES: List[int] = [16, 32, 64, 128, 256, 512]
+    SEARCH_PROFILE_LIMITS: List[int] = [50, 100, 200]
+    
+    # Index rebuilds (versioned collections behind aliases)
+    INDEX_VERSIONS_TO_KEEP: int = 1  # previous versions kept for rollback
+    INDEX_WARMUP_QUERIES: int = 20
+    INDEX_WARMUP_TIMEOUT: float = 3600.0  # seconds for the HNSW build to turn the collection GREEN
+    # Bulk vector upload: HNSW is off while loading and built once at the end
+    INDEX_UPLOAD_BATCH_SIZE: int = 256  # points per request
+    INDEX_UPLOAD_PARALLEL: int = 4  # upload worker processes
+    INDEX_HNSW_M: int = 16  # restored after the load
+    INDEX_INDEXING_THRESHOLD: int = 20000  # KB, Qdrant's default
+    INDEX_VERIFY_TIMEOUT: float = 300.0  # seconds to wait for unacknowledged points to land
+    KEYWORD_ENCODE_BATCH_SIZE: int = 512  # distinct keywords per embedding batch
+    
+    # Builder ingestion (object JSON parsed in worker processes, one SQLite writer)
+    BUILD_PARSE_WORKERS: int = max(1, (os.cpu_count() or 2) - 1)  # 1 parses in-process
+    BUILD_FILES_PER_TASK: int = 64
+    BUILD_INSERT_CHUNK_ROWS: int = 50000  # rows per executemany/transaction
+    BUILD_MANIFEST_PATH: Path = BASE_DIR / "data" / "processed_data" / "build_manifest.json"
+    BUILD_STATE_PATH: Path = BASE_DIR / "data" / "processed_data" / "build_state.json"  # incremental checkpoint
+    BUILD_CHECKPOINT_VIDEOS: int = 50  # videos per committed incremental batch
+    # Full builds load the staging file with these, then VACUUM INTO the served file
+    SQLITE_BULK_LOAD_PRAGMAS: Dict[str, Any] = {
+        "journal_mode": "OFF",
+        "synchronous": "OFF",
+        "cache_size": -1048576,  # 1GB
+        "locking_mode": "EXCLUSIVE",
+        "temp_store": "MEMORY"
+    }
+    SQLITE_SERVING_JOURNAL_MODE: str = "DELETE"
+    # Parquet copy of map-keyframes and objects, one file per data batch (needs pyarrow)
+    COLUMNAR_STORE_ENABLED: bool = True
+    COLUMNAR_STORE_DIR: Path = BASE_DIR / "data" / "processed_data" / "columnar"
+    COLUMNAR_STORE_COMPRESSION: str = "zstd"
+    # Stages holding a resource at the same time; stages run concurrently otherwise
+    BUILD_STAGE_LIMITS: Dict[str, int] = {
+        "sqlite": 1,  # one writer per database file
+        "qdrant": 2,
+        "model": 1  # embedding model inference
+    }
+    
+    # Snapshot bundles (export/restore for new search nodes)
+    SNAPSHOT_DIR: Path = BASE_DIR / "data" / "snapshots"
+    SNAPSHOT_CHUNK_SIZE: int = 64 * 1024 * 1024  # bytes
+    SNAPSHOT_TRANSFER_WORKERS: int = 8
+    
     # # ===== AGENT SETTINGS =====
     # # LLM Settings
     # LLM_TEMPERATURE: float = 0.1
@@ -4,6 +4,7 @@ import time
 from typing import Dict, List
 from agents.orchestrator_agent import OrchestratorAgent
 from config.settings import settings
+from tools.query_stats import get_query_stats
 
 class VideoSearchSystem:
     def __init__(self):
@@ -116,6 +117,10 @@ class VideoSearchSystem:
             'agent_usage': agent_usage,
             'cache_hits': sum(1 for s in self.search_history if 'cache_hit' in s.get('metadata', {}))
         }
+    
+    def get_database_report(self) -> Dict:
+        """Get SQLite query timings and slow queries"""
+        return get_query_stats().report()
 
 async def main():
     """Main function for testing the system"""
@@ -137,9 +142,10 @@ async def main():
         print("1. Enter custom query")
         print("2. Test with sample queries")
         print("3. View system stats")
-        print("4. Exit")
+        print("4. View database query report")
+        print("5. Exit")
         
-        choice = input("\nChọn option (1-4): ").strip()
+        choice = input("\nChọn option (1-5): ").strip()
         
         if choice == '1':
             query = input("Nhập query: ").strip()
@@ -156,6 +162,11 @@ async def main():
             print(json.dumps(stats, indent=2, ensure_ascii=False))
         
         elif choice == '4':
+            report = search_system.get_database_report()
+            print("\n🗄️  Database Query Report:")
+            print(json.dumps(report, indent=2, ensure_ascii=False))
+        
+        elif choice == '5':
             print("👋 Goodbye!")
             break
         
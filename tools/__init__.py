@@ -1,5 +1,7 @@
 from .sqlite_tool import SQLiteTool
+from .async_sqlite import AsyncSQLiteTool
 from .qdrant_tool import QdrantTool
+from .object_index import ObjectIndex
 from .gemini_client import GeminiClient
 
-__all__ = ['SQLiteTool', 'QdrantTool', 'GeminiClient']
\ No newline at end of file
+__all__ = ['SQLiteTool', 'AsyncSQLiteTool', 'QdrantTool', 'ObjectIndex', 'GeminiClient']
\ No newline at end of file
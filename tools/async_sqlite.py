@@ -0,0 +1,100 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Callable, Optional
+from config.settings import settings
+from .sqlite_tool import SQLiteTool
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_reader_executor() -> ThreadPoolExecutor:
+    """Reader threads shared by every AsyncSQLiteTool; each thread owns one pooled connection"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.SQLITE_READER_THREADS,
+                                           thread_name_prefix="sqlite-reader")
+        return _executor
+
+class AsyncSQLiteTool:
+    """Awaitable facade over SQLiteTool.
+
+    Every public SQLiteTool method is available as a coroutine, e.g.
+    `await tool.search_objects(names)`. Queries run on the reader thread
+    pool so they never block the event loop; cancelling the awaiting task
+    interrupts a query that is already running.
+    """
+
+    def __init__(self, sqlite_tool: Optional[SQLiteTool] = None):
+        self.sqlite_tool = sqlite_tool or SQLiteTool()
+        self.executor = get_reader_executor()
+        self._lock = threading.Lock()
+        self._metrics = {'queries': 0, 'cancelled': 0, 'queue_wait_total_ms': 0.0, 'queue_wait_max_ms': 0.0}
+
+    def __getattr__(self, name: str):
+        if name == 'sqlite_tool':
+            raise AttributeError(name)
+        method = getattr(self.sqlite_tool, name)
+        if name.startswith('_') or not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+        return call
+
+    def _record_wait(self, wait_ms: float):
+        with self._lock:
+            self._metrics['queries'] += 1
+            self._metrics['queue_wait_total_ms'] += wait_ms
+            self._metrics['queue_wait_max_ms'] = max(self._metrics['queue_wait_max_ms'], wait_ms)
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run a blocking SQLiteTool query on a reader thread; database errors yield []"""
+        loop = asyncio.get_running_loop()
+        submitted_at = time.perf_counter()
+        state = {'conn': None, 'running': False}
+        state_lock = threading.Lock()
+
+        def task():
+            self._record_wait((time.perf_counter() - submitted_at) * 1000)
+            try:
+                # same contract as SQLiteTool.execute_query: a missing or unreadable
+                # database is logged and yields no rows
+                with state_lock:
+                    state['conn'] = self.sqlite_tool.pool.connection()
+                    state['running'] = True
+                return fn(*args, **kwargs)
+            except (sqlite3.Error, OSError) as e:
+                print(f"SQLite Error: {e}")
+                return []
+            finally:
+                with state_lock:
+                    state['running'] = False
+
+        try:
+            return await loop.run_in_executor(self.executor, task)
+        except asyncio.CancelledError:
+            # Not started yet: the executor drops it. Running: stop the statement.
+            with state_lock:
+                if state['running']:
+                    state['conn'].interrupt()
+            with self._lock:
+                self._metrics['cancelled'] += 1
+            raise
+
+    async def run_in_executor(self, fn: Callable, *args, **kwargs):
+        """Run a blocking non-query callable on a reader thread; its errors propagate"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: fn(*args, **kwargs))
+
+    def stats(self) -> Dict:
+        """Queue-wait and pool metrics"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics['queue_wait_avg_ms'] = metrics['queue_wait_total_ms'] / metrics['queries'] if metrics['queries'] else 0.0
+        metrics['reader_threads'] = settings.SQLITE_READER_THREADS
+        metrics['pool'] = self.sqlite_tool.get_pool_stats()
+        return metrics
@@ -0,0 +1,200 @@
+import threading
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+from config.settings import settings
+from utils.query_parser import QueryParser
+from .sqlite_pool import get_connection_pool
+
+class ObjectIndexSnapshot:
+    """One immutable build of the object index; every query of a request should use the same one.
+
+    Every keyframe gets an int32 ordinal. Each class maps to
+    a sorted array of ordinals plus the best confidence per keyframe, so
+    AND/OR/NOT queries are NumPy set operations instead of SQL GROUP BYs.
+    Detections below min_confidence are not indexed. A parallel
+    uint8 array holds how many detections of the class reach
+    OBJECT_COUNT_MIN_CONFIDENCE, for counting queries.
+    """
+
+    def __init__(self, keyframes: List[Tuple[str, str]],
+                 postings: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]], min_confidence: float):
+        self.keyframes = keyframes  # ordinal -> (video_id, keyframe_id)
+        self.postings = postings  # class -> (ordinals, best confidences, uint8 counts), all aligned
+        self.min_confidence = min_confidence
+
+    def classes(self) -> List[str]:
+        return sorted(self.postings)
+
+    def supports(self, confidence_threshold: float) -> bool:
+        """False when the threshold reaches below what was indexed; use SQL then"""
+        return confidence_threshold >= self.min_confidence
+
+    def matching(self, object_name: str, confidence_threshold: float = 0.5) -> np.ndarray:
+        """Sorted ordinals of keyframes containing object_name at or above the threshold"""
+        if not self.supports(confidence_threshold):
+            raise ValueError(f"confidence_threshold {confidence_threshold} is below the indexed "
+                             f"minimum {self.min_confidence}")
+        entry = self.postings.get(object_name.lower())
+        if entry is None:
+            return np.empty(0, dtype=np.int32)
+        ordinals, confidences, _ = entry
+        if confidence_threshold == self.min_confidence:
+            return ordinals
+        return ordinals[confidences >= confidence_threshold]
+
+    def query(self, all_of: List[str] = None, any_of: List[str] = None,
+              none_of: List[str] = None, confidence_threshold: float = 0.5) -> np.ndarray:
+        """Keyframe ordinals matching (AND all_of) AND (OR any_of) AND NOT (OR none_of)"""
+        all_of, any_of, none_of = all_of or [], any_of or [], none_of or []
+        candidates = None
+
+        # Intersect smallest lists first so the working set shrinks fastest
+        for ordinals in sorted((self.matching(n, confidence_threshold) for n in all_of), key=len):
+            candidates = ordinals if candidates is None else np.intersect1d(candidates, ordinals, assume_unique=True)
+            if not len(candidates):
+                return candidates
+
+        if any_of:
+            union = self.matching(any_of[0], confidence_threshold)
+            for name in any_of[1:]:
+                union = np.union1d(union, self.matching(name, confidence_threshold))
+            candidates = union if candidates is None else np.intersect1d(candidates, union, assume_unique=True)
+
+        if candidates is None:
+            if not none_of:
+                return np.empty(0, dtype=np.int32)
+            # only exclusions: every keyframe except theirs
+            candidates = np.arange(len(self.keyframes), dtype=np.int32)
+
+        for name in none_of:
+            candidates = np.setdiff1d(candidates, self.matching(name, confidence_threshold), assume_unique=True)
+
+        return candidates
+
+    def _lookup(self, object_name: str, ordinals: np.ndarray, column: int, dtype) -> np.ndarray:
+        """Per-keyframe value from a posting column, 0 where object_name is absent"""
+        result = np.zeros(len(ordinals), dtype=dtype)
+        entry = self.postings.get(object_name.lower())
+        if entry is None or not len(ordinals):
+            return result
+        class_ordinals, class_values = entry[0], entry[column]
+        positions = np.searchsorted(class_ordinals, ordinals)
+        positions = np.minimum(positions, len(class_ordinals) - 1)
+        found = class_ordinals[positions] == ordinals
+        result[found] = class_values[positions[found]]
+        return result
+
+    def confidences(self, object_name: str, ordinals: np.ndarray) -> np.ndarray:
+        """Best confidence of object_name in each keyframe, 0 where it is absent"""
+        return self._lookup(object_name, ordinals, 1, np.float32)
+
+    def object_counts(self, object_name: str, ordinals: np.ndarray) -> np.ndarray:
+        """Number of confident object_name detections in each keyframe"""
+        return self._lookup(object_name, ordinals, 2, np.uint8)
+
+    def count_query(self, predicates: Dict[str, object]) -> np.ndarray:
+        """Keyframe ordinals whose class counts satisfy every QueryParser.parse_count_range spec"""
+        ranges = {name.lower(): QueryParser.parse_count_range(spec) for name, spec in predicates.items()}
+
+        # Classes that must be present bound the candidates before any counting
+        present = [name for name, (low, _) in ranges.items() if low > 0]
+        if present:
+            candidates = self.query(all_of=present, confidence_threshold=self.min_confidence)
+        else:
+            candidates = np.arange(len(self.keyframes), dtype=np.int32)
+
+        mask = np.ones(len(candidates), dtype=bool)
+        for name, (low, high) in ranges.items():
+            counts = self.object_counts(name, candidates)
+            mask &= (counts >= low) & (counts <= high)
+        return candidates[mask]
+
+    def keyframe_keys(self, ordinals: np.ndarray) -> List[Tuple[str, str]]:
+        return [self.keyframes[i] for i in ordinals]
+
+class ObjectIndex:
+    """Loads ObjectIndexSnapshots of a database file and swaps in a new one after a rebuild.
+
+    snapshot() is the current build; queries on the ObjectIndex itself each
+    use the snapshot current at the time of the call.
+    """
+
+    def __init__(self, db_path=None, min_confidence: Optional[float] = None):
+        self.db_path = Path(db_path or settings.METADATA_KEYFRAME_OBJECT_DB_PATH)
+        self.min_confidence = settings.OBJECT_INDEX_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self.pool = get_connection_pool(self.db_path)
+        self._snapshot = ObjectIndexSnapshot([], {}, self.min_confidence)
+        self.identity = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """(Re)build the index from the objects table"""
+        identity = self.pool._file_identity()
+        query = """
+        SELECT video_id, keyframe_id, lower(object_name) AS object_name, MAX(confidence) AS confidence,
+               SUM(confidence >= ?) AS count
+        FROM objects
+        WHERE confidence >= ?
+        GROUP BY video_id, keyframe_id, lower(object_name)
+        ORDER BY video_id, keyframe_id
+        """
+        conn = self.pool.connection()
+        df = pd.read_sql_query(query, conn, params=(settings.OBJECT_COUNT_MIN_CONFIDENCE, self.min_confidence))
+        # Every keyframe gets an ordinal, with or without detections, so count
+        # queries with zero/upper bounds see the same keyframes as the SQL path
+        keyframes = pd.read_sql_query("SELECT video_id, keyframe_id FROM keyframes ORDER BY video_id, keyframe_id", conn)
+        uniques = pd.MultiIndex.from_frame(keyframes)
+
+        # Both are ordered by keyframe, so ordinals ascend and every posting list is sorted;
+        # detections of keyframes missing from the keyframes table are dropped, as SQL joins do
+        codes = uniques.get_indexer(pd.MultiIndex.from_frame(df[['video_id', 'keyframe_id']]))
+        df = df[codes >= 0]
+        codes = codes[codes >= 0].astype(np.int32)
+        confidences = df['confidence'].to_numpy(dtype=np.float32)
+        object_counts = np.minimum(df['count'].to_numpy(), 255).astype(np.uint8)
+        names = df['object_name']
+
+        postings = {}
+        for name, rows in names.groupby(names, sort=False).indices.items():
+            postings[name] = (codes[rows], confidences[rows], object_counts[rows])
+
+        # Readers hold whole snapshots, so one reference swap publishes the new build
+        snapshot = ObjectIndexSnapshot(list(uniques), postings, self.min_confidence)
+        with self._lock:
+            self._snapshot = snapshot
+            self.identity = identity
+
+        print(f"Object index loaded: {len(postings)} classes, {len(snapshot.keyframes)} keyframes, "
+              f"{len(df)} postings")
+        return self
+
+    def refresh(self):
+        """Reload when the builder has published a new database file"""
+        with self._lock:
+            identity = self.identity
+        if identity != self.pool._file_identity():
+            self.load()
+
+    def snapshot(self) -> ObjectIndexSnapshot:
+        return self._snapshot
+
+    def __getattr__(self, name: str):
+        # classes, supports, matching, query, count_query, ... on the current snapshot
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.snapshot(), name)
+
+_indexes: Dict[str, ObjectIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_object_index(db_path=None) -> ObjectIndex:
+    """Shared index per database file, built on first use and rebuilt after a rebuild is published"""
+    key = str(Path(db_path or settings.METADATA_KEYFRAME_OBJECT_DB_PATH).resolve())
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = ObjectIndex(key).load()
+        index = _indexes[key]
+        index.refresh()
+        return index
@@ -1,57 +1,148 @@
+import heapq
+from concurrent.futures import ThreadPoolExecutor, wait
 from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, Range
-from typing import List, Dict, Any, Optional
+from qdrant_client.models import Filter, FieldCondition, Range, SearchParams
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from config.settings import settings
 
 class QdrantTool:
-    def __init__(self, collection_name):
-        self.client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+    def __init__(self, collection_name, shards: Optional[List[Tuple[QdrantClient, str]]] = None):
+        """shards: (client, collection name) pairs to fan keyframe searches out to.
+        Any clients work here, e.g. several QdrantClient(":memory:") instances."""
+        if shards:
+            self.client = shards[0][0]
+            self.shards = shards
+        else:
+            self.client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+            self.shards = [(self.client, collection_name)]
         self.collection_name = collection_name
+        # A shard that misses the deadline keeps its worker until the client's own
+        # request timeout ends the call, so leave room for the next fan-out
+        self.executor = ThreadPoolExecutor(max_workers=2 * len(self.shards)) if len(self.shards) > 1 else None
+    
+    def _fan_out(self, search_fn: Callable[[QdrantClient, str], List]) -> List[List]:
+        """Run search_fn on every shard concurrently and return the per-shard results that arrived in time"""
+        if self.executor is None:
+            return [search_fn(*self.shards[0])]
+        
+        futures = {self.executor.submit(search_fn, client, name): name for client, name in self.shards}
+        done, not_done = wait(futures, timeout=settings.QDRANT_SHARD_TIMEOUT)
+        
+        shard_results = []
+        for future in done:
+            try:
+                shard_results.append(future.result())
+            except Exception as e:
+                print(f"Qdrant shard '{futures[future]}' error: {e}")
+        for future in not_done:
+            future.cancel()  # only stops calls still queued; running ones end at the client timeout
+            print(f"Qdrant shard '{futures[future]}' timed out after {settings.QDRANT_SHARD_TIMEOUT}s")
+        
+        return shard_results
+    
+    def _build_video_filter(self, video_filter: Optional[List[str]]) -> Optional[Filter]:
+        """Restrict a search to the given videos"""
+        if not video_filter:
+            return None
+        return Filter(
+            must=[
+                FieldCondition(
+                    key="video_id",
+                    match={"any": video_filter}
+                )
+            ]
+        )
+    
+    def _build_search_params(self, hnsw_ef: Optional[int], exact: bool) -> Optional[SearchParams]:
+        if hnsw_ef is None and not exact:
+            return None  # collection defaults
+        return SearchParams(hnsw_ef=hnsw_ef, exact=exact)
+    
+    def _format_keyframe_hit(self, result) -> Dict:
+        return {
+            'video_id': result.payload['video_id'],
+            'keyframe_id': result.payload['keyframe_id'],
+            'similarity_score': float(result.score),
+            'qdrant_id': result.id
+        }
     
     def search_similar_keyframes(self, query_vector: List[float], 
                                 limit: int = 100,
                                 similarity_threshold: float = 0.7,
-                                video_filter: Optional[List[str]] = None) -> List[Dict]:
+                                video_filter: Optional[List[str]] = None,
+                                hnsw_ef: Optional[int] = None,
+                                exact: bool = False) -> List[Dict]:
         """Search for visually similar keyframes"""
         try:
-            # Build filter if needed
-            search_filter = None
-            if video_filter:
-                search_filter = Filter(
-                    must=[
-                        FieldCondition(
-                            key="video_id",
-                            match={"any": video_filter}
-                        )
-                    ]
-                )
-            
             print(f"similarity threshold: {similarity_threshold}")
-            # Perform search
-            search_results = self.client.search(
-                collection_name=self.collection_name,
-                query_vector=query_vector,
-                limit=limit,
-                score_threshold=similarity_threshold,
-                query_filter=search_filter
-            )
+            search_filter = self._build_video_filter(video_filter)
+            search_params = self._build_search_params(hnsw_ef, exact)
             
-            # Format results
-            results = []
-            for result in search_results:
-                results.append({
-                    'video_id': result.payload['video_id'],
-                    'keyframe_id': result.payload['keyframe_id'],
-                    'similarity_score': float(result.score),
-                    'qdrant_id': result.id
-                })
+            def search_shard(client: QdrantClient, collection_name: str) -> List[Dict]:
+                search_results = client.search(
+                    collection_name=collection_name,
+                    query_vector=query_vector,
+                    limit=limit,
+                    score_threshold=similarity_threshold,
+                    query_filter=search_filter,
+                    search_params=search_params
+                )
+                return [self._format_keyframe_hit(result) for result in search_results]
             
-            return results
+            # Merge per-shard top-k into a global top-k
+            shard_results = self._fan_out(search_shard)
+            return heapq.nlargest(limit, (hit for hits in shard_results for hit in hits),
+                                  key=lambda hit: hit['similarity_score'])
             
         except Exception as e:
             print(f"Qdrant search error: {e}")
             return []
     
+    def search_video_groups(self, query_vector: List[float],
+                            group_limit: int = 20,
+                            group_size: int = 5,
+                            similarity_threshold: float = 0.7,
+                            video_filter: Optional[List[str]] = None,
+                            hnsw_ef: Optional[int] = None,
+                            exact: bool = False) -> List[Dict]:
+        """Search similar keyframes grouped by video, at most group_size keyframes per video"""
+        try:
+            search_filter = self._build_video_filter(video_filter)
+            search_params = self._build_search_params(hnsw_ef, exact)
+            
+            def search_shard(client: QdrantClient, collection_name: str) -> List[Dict]:
+                groups_result = client.search_groups(
+                    collection_name=collection_name,
+                    query_vector=query_vector,
+                    group_by="video_id",
+                    limit=group_limit,
+                    group_size=group_size,
+                    score_threshold=similarity_threshold,
+                    query_filter=search_filter,
+                    search_params=search_params
+                )
+                
+                results = []
+                for group in groups_result.groups:
+                    keyframes = [self._format_keyframe_hit(hit) for hit in group.hits]
+                    if not keyframes:
+                        continue
+                    results.append({
+                        'video_id': group.id,
+                        'similarity_score': keyframes[0]['similarity_score'],
+                        'keyframes': keyframes
+                    })
+                return results
+            
+            # A video lives on exactly one shard, so groups never overlap across shards
+            shard_results = self._fan_out(search_shard)
+            return heapq.nlargest(group_limit, (group for groups in shard_results for group in groups),
+                                  key=lambda group: group['similarity_score'])
+            
+        except Exception as e:
+            print(f"Qdrant group search error: {e}")
+            return []
+    
     def search_similar_keyword(self, query_vector: List[float],
                                limit: int = 10,
                                similarity_threshold: float = 0.7):
@@ -76,31 +167,27 @@ class QdrantTool:
     def search_by_video_ids(self, video_ids: List[str], limit: int = 50) -> List[Dict]:
         """Get all keyframes from specific videos"""
         try:
-            search_filter = Filter(
-                must=[
-                    FieldCondition(
-                        key="video_id",
-                        match={"any": video_ids}
-                    )
-                ]
-            )
-            
-            # Use scroll for getting all results
-            scroll_results = self.client.scroll(
-                collection_name=self.collection_name,
-                scroll_filter=search_filter,
-                limit=limit
-            )
+            search_filter = self._build_video_filter(video_ids)
             
-            results = []
-            for point in scroll_results[0]:  # scroll_results is (points, next_page_offset)
-                results.append({
-                    'video_id': point.payload['video_id'],
-                    'keyframe_id': point.payload['keyframe_id'],
-                    'qdrant_id': point.id
-                })
+            def scroll_shard(client: QdrantClient, collection_name: str) -> List[Dict]:
+                # Use scroll for getting all results
+                scroll_results = client.scroll(
+                    collection_name=collection_name,
+                    scroll_filter=search_filter,
+                    limit=limit
+                )
+                
+                results = []
+                for point in scroll_results[0]:  # scroll_results is (points, next_page_offset)
+                    results.append({
+                        'video_id': point.payload['video_id'],
+                        'keyframe_id': point.payload['keyframe_id'],
+                        'qdrant_id': point.id
+                    })
+                return results
             
-            return results
+            shard_results = self._fan_out(scroll_shard)
+            return [point for points in shard_results for point in points][:limit]
             
         except Exception as e:
             print(f"Qdrant video filter error: {e}")
@@ -109,11 +196,12 @@ class QdrantTool:
     def get_collection_info(self) -> Dict:
         """Get collection statistics"""
         try:
-            info = self.client.get_collection(self.collection_name)
+            infos = [client.get_collection(name) for client, name in self.shards]
             return {
-                'points_count': info.points_count,
-                'vectors_count': info.vectors_count,
-                'status': info.status
+                'points_count': sum(info.points_count or 0 for info in infos),
+                'vectors_count': sum(info.vectors_count or 0 for info in infos),
+                'status': infos[0].status if len(infos) == 1 else [info.status for info in infos],
+                'shards': len(infos)
             }
         except Exception as e:
             print(f"Collection info error: {e}")
@@ -122,7 +210,12 @@ class QdrantTool:
     def health_check(self) -> bool:
         """Check if Qdrant is healthy"""
         try:
-            collections = self.client.get_collections()
-            return self.collection_name in [c.name for c in collections.collections]
+            for client, collection_name in self.shards:
+                collections = client.get_collections()
+                aliases = client.get_aliases()
+                names = [c.name for c in collections.collections] + [a.alias_name for a in aliases.aliases]
+                if collection_name not in names:
+                    return False
+            return True
         except Exception:
             return False
\ No newline at end of file
@@ -0,0 +1,145 @@
+import re
+import time
+import sqlite3
+import threading
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional
+from config.settings import settings
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+@lru_cache(maxsize=1024)
+def normalize_query(query: str) -> str:
+    """Statement template: collapse whitespace and variable-length IN (?, ?, ...) lists"""
+    template = re.sub(r'\s+', ' ', query).strip()
+    return re.sub(r'\bIN \(\s*\?(\s*,\s*\?)*\s*\)', 'IN (?, ...)', template, flags=re.IGNORECASE)
+
+# SCAN steps that are not table scans: table-valued parameter lists, and
+# R*Tree lookups by rowid (1:) or by box constraints (2:<constraints>)
+ALLOWED_PLAN_SCANS = [
+    re.compile(r'^SCAN (json_each|json_tree)\b'),
+    re.compile(r'^SCAN \w+ VIRTUAL TABLE INDEX (1:|2:\S)'),
+]
+
+def full_scans(plan: List[str]) -> List[str]:
+    """Plan steps that read a whole table or index; hot tables must be SEARCHed"""
+    return [
+        step for step in plan
+        if step.startswith('SCAN ') and not any(pattern.match(step) for pattern in ALLOWED_PLAN_SCANS)
+    ]
+
+class QueryStats:
+    """Per-template timing histograms, row counts and a slow-query log with query plans"""
+
+    def __init__(self, slow_threshold_ms: Optional[float] = None, max_slow_queries: int = 200):
+        self.slow_threshold_ms = settings.SQLITE_SLOW_QUERY_MS if slow_threshold_ms is None else slow_threshold_ms
+        self._lock = threading.Lock()
+        self._templates: Dict[str, Dict] = {}
+        self._slow_queries = deque(maxlen=max_slow_queries)
+
+    def _template_stats(self, template: str) -> Dict:
+        stats = self._templates.get(template)
+        if stats is None:
+            stats = {
+                'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0,
+                'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                'plan': None, 'full_scans': []
+            }
+            self._templates[template] = stats
+        return stats
+
+    def record(self, query: str, params: tuple, elapsed_ms: float, row_count: int,
+               conn: Optional[sqlite3.Connection] = None):
+        template = normalize_query(query)
+        with self._lock:
+            stats = self._template_stats(template)
+            stats['count'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['rows'] += row_count
+            stats['buckets'][bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+            needs_plan = elapsed_ms >= self.slow_threshold_ms and stats['plan'] is None
+
+        if elapsed_ms < self.slow_threshold_ms:
+            return
+
+        # Plan once per template; the slow log keeps every occurrence
+        if needs_plan and conn is not None:
+            plan = self._explain(conn, query, params)
+            with self._lock:
+                stats['plan'] = plan
+                stats['full_scans'] = full_scans(plan)
+
+        with self._lock:
+            self._slow_queries.append({
+                'template': template,
+                'elapsed_ms': elapsed_ms,
+                'rows': row_count,
+                'at': time.time(),
+                'full_scans': stats['full_scans']
+            })
+
+    def record_error(self, query: str):
+        with self._lock:
+            self._template_stats(normalize_query(query))['errors'] += 1
+
+    def _explain(self, conn: sqlite3.Connection, query: str, params: tuple) -> List[str]:
+        try:
+            return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        except sqlite3.Error as e:
+            return [f"EXPLAIN failed: {e}"]
+
+    def report(self) -> Dict:
+        """Templates ordered by total time, plus the recent slow queries"""
+        with self._lock:
+            templates = []
+            for template, stats in self._templates.items():
+                templates.append({
+                    'template': template,
+                    'count': stats['count'],
+                    'errors': stats['errors'],
+                    'total_ms': stats['total_ms'],
+                    'avg_ms': stats['total_ms'] / stats['count'] if stats['count'] else 0.0,
+                    'max_ms': stats['max_ms'],
+                    'avg_rows': stats['rows'] / stats['count'] if stats['count'] else 0.0,
+                    'histogram': dict(zip([f"le_{b}" for b in LATENCY_BUCKETS_MS] + ['le_inf'], stats['buckets'])),
+                    'plan': stats['plan'],
+                    'full_scans': stats['full_scans']
+                })
+            slow_queries = list(self._slow_queries)
+
+        templates.sort(key=lambda t: t['total_ms'], reverse=True)
+        return {'slow_threshold_ms': self.slow_threshold_ms, 'templates': templates, 'slow_queries': slow_queries}
+
+    def format_prometheus(self) -> str:
+        """Histogram per template in Prometheus text exposition format"""
+        lines = [
+            '# TYPE sqlite_query_duration_ms histogram',
+        ]
+        with self._lock:
+            for template, stats in self._templates.items():
+                label = template.replace('\\', '\\\\').replace('"', '\\"')
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS_MS + ['+Inf'], stats['buckets']):
+                    cumulative += count
+                    lines.append(f'sqlite_query_duration_ms_bucket{{template="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'sqlite_query_duration_ms_sum{{template="{label}"}} {stats["total_ms"]}')
+                lines.append(f'sqlite_query_duration_ms_count{{template="{label}"}} {stats["count"]}')
+                lines.append(f'sqlite_query_rows_total{{template="{label}"}} {stats["rows"]}')
+                lines.append(f'sqlite_query_errors_total{{template="{label}"}} {stats["errors"]}')
+                lines.append(f'sqlite_query_full_scan{{template="{label}"}} {int(bool(stats["full_scans"]))}')
+        return '\n'.join(lines) + '\n'
+
+_query_stats: Optional[QueryStats] = None
+_query_stats_lock = threading.Lock()
+
+def get_query_stats() -> QueryStats:
+    """Process-wide query statistics shared by every SQLiteTool"""
+    global _query_stats
+    with _query_stats_lock:
+        if _query_stats is None:
+            _query_stats = QueryStats()
+        return _query_stats
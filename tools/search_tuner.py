@@ -0,0 +1,144 @@
+import json
+import time
+import threading
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+from qdrant_client import QdrantClient
+from qdrant_client.models import SearchParams
+from config.settings import settings
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+def _profile_collection(client: QdrantClient, collection_name: str, sample_size: int,
+                        ef_values: List[int], limits: List[int]) -> List[Dict]:
+    sample_points, _ = client.scroll(
+        collection_name=collection_name,
+        limit=sample_size,
+        with_vectors=True,
+        with_payload=False
+    )
+    query_vectors = [point.vector for point in sample_points]
+    if not query_vectors:
+        raise ValueError(f"Collection '{collection_name}' has no points to profile")
+
+    def run(search_params: SearchParams, limit: int):
+        latencies, hits = [], []
+        for vector in query_vectors:
+            start = time.perf_counter()
+            result = client.search(collection_name=collection_name, query_vector=vector,
+                                   limit=limit, search_params=search_params)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits.append({point.id for point in result})
+        return latencies, hits
+
+    entries = []
+    for limit in limits:
+        exact_latencies, exact_hits = run(SearchParams(exact=True), limit)
+        entries.append({
+            'limit': limit, 'hnsw_ef': None, 'exact': True, 'recall': 1.0,
+            'p95_ms': _percentile(exact_latencies, 0.95)
+        })
+
+        for ef in ef_values:
+            if ef < limit:
+                continue  # ef below limit cannot return limit candidates
+            latencies, hits = run(SearchParams(hnsw_ef=ef), limit)
+            recall = sum(len(h & e) / max(len(e), 1) for h, e in zip(hits, exact_hits)) / len(hits)
+            entries.append({
+                'limit': limit, 'hnsw_ef': ef, 'exact': False, 'recall': recall,
+                'p95_ms': _percentile(latencies, 0.95)
+            })
+    return entries
+
+def profile_search_params(shards: List[Tuple[QdrantClient, str]],
+                          sample_size: int = 50,
+                          ef_values: Optional[List[int]] = None,
+                          limits: Optional[List[int]] = None,
+                          output_path: Optional[Path] = None) -> List[Dict]:
+    """Measure recall and p95 latency of hnsw_ef/limit/exact combinations offline.
+
+    Every shard is profiled against exact search on vectors sampled from
+    itself. A search waits for its slowest shard, so each combination keeps
+    the worst shard's latency and the mean recall. The profile is written
+    to SEARCH_PROFILE_PATH.
+    """
+    ef_values = ef_values or settings.SEARCH_PROFILE_EF_VALUES
+    limits = limits or settings.SEARCH_PROFILE_LIMITS
+    output_path = Path(output_path or settings.SEARCH_PROFILE_PATH)
+
+    per_shard = [_profile_collection(client, name, sample_size, ef_values, limits) for client, name in shards]
+    entries = []
+    for shard_entries in zip(*per_shard):
+        entry = dict(shard_entries[0])
+        entry['recall'] = sum(e['recall'] for e in shard_entries) / len(shard_entries)
+        entry['p95_ms'] = max(e['p95_ms'] for e in shard_entries)
+        entries.append(entry)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({'collections': [name for _, name in shards], 'sample_size': sample_size, 'entries': entries},
+                  f, indent=2)
+
+    return entries
+
+class SearchParamTuner:
+    """Pick per-request search params that fit a latency budget.
+
+    Profiled p95 latencies are scaled by a load factor, an EWMA of observed
+    over expected latency, so ef drops under load and rises again when
+    there is headroom.
+    """
+
+    def __init__(self, profile_path: Optional[Path] = None, smoothing: float = 0.2):
+        self.entries = []
+        self.load_factor = 1.0
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+
+        profile_path = Path(profile_path or settings.SEARCH_PROFILE_PATH)
+        if profile_path.exists():
+            with open(profile_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get('entries', [])
+
+    def choose(self, limit: int, budget_ms: Optional[float] = None) -> Dict:
+        """Return the highest-recall params expected to finish within budget"""
+        budget_ms = budget_ms or settings.VISUAL_SEARCH_LATENCY_BUDGET_MS
+        default = {'limit': limit, 'hnsw_ef': None, 'exact': False, 'profiled_ms': None, 'budget_ms': budget_ms}
+        if not self.entries:
+            return default
+
+        # Use the smallest profiled limit that still covers the request
+        profiled_limits = sorted({entry['limit'] for entry in self.entries})
+        profile_limit = next((l for l in profiled_limits if l >= limit), profiled_limits[-1])
+        candidates = [entry for entry in self.entries if entry['limit'] == profile_limit]
+
+        with self._lock:
+            load_factor = self.load_factor
+
+        within_budget = [entry for entry in candidates if entry['p95_ms'] * load_factor <= budget_ms]
+        if within_budget:
+            best = max(within_budget, key=lambda entry: (entry['recall'], -entry['p95_ms']))
+        else:
+            best = min(candidates, key=lambda entry: entry['p95_ms'])
+
+        return {
+            'limit': limit,
+            'hnsw_ef': best['hnsw_ef'],
+            'exact': best['exact'],
+            'profiled_ms': best['p95_ms'],
+            'expected_ms': best['p95_ms'] * load_factor,
+            'expected_recall': best['recall'],
+            'budget_ms': budget_ms
+        }
+
+    def record(self, params: Dict, latency_ms: float):
+        """Feed back an observed latency for params returned by choose()"""
+        if not params.get('profiled_ms'):
+            return
+        with self._lock:
+            ratio = latency_ms / max(params['profiled_ms'], 1e-3)
+            self.load_factor = (1 - self.smoothing) * self.load_factor + self.smoothing * ratio
+            self.load_factor = min(max(self.load_factor, 0.25), 20.0)
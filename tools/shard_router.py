@@ -0,0 +1,47 @@
+import re
+import zlib
+from typing import List, Optional, Tuple
+from qdrant_client import QdrantClient
+from config.settings import settings
+
+BATCH_PATTERN = re.compile(r'^L(\d+)_')
+
+def shard_for_video(video_id: str, num_shards: int, strategy: str = None) -> int:
+    """Pick the shard a video's keyframes live on"""
+    if num_shards <= 1:
+        return 0
+
+    strategy = strategy or settings.QDRANT_SHARD_STRATEGY
+    if strategy == "batch":
+        # L01_V001 -> batch 1, so each data batch stays on one shard
+        match = BATCH_PATTERN.match(video_id)
+        if match:
+            return int(match.group(1)) % num_shards
+
+    return zlib.crc32(video_id.encode("utf-8")) % num_shards
+
+def shard_collection_names(collection_name: str, num_shards: int) -> List[str]:
+    """Collection names used when shards are collections on a single Qdrant node"""
+    if num_shards <= 1:
+        return [collection_name]
+    return [f"{collection_name}_shard{i:02d}" for i in range(num_shards)]
+
+def get_video_shards(timeout: Optional[float] = None) -> List[Tuple[QdrantClient, str]]:
+    """(client, collection name) for every keyframe shard, in shard order.
+
+    timeout is the clients' request timeout; the default (the client's own)
+    suits the builder, searches pass QDRANT_SHARD_TIMEOUT.
+    """
+    options = {} if timeout is None else {"timeout": max(1, int(timeout))}
+
+    if settings.QDRANT_SHARD_ENDPOINTS:
+        shards = []
+        for endpoint in settings.QDRANT_SHARD_ENDPOINTS:
+            host, port = endpoint.rsplit(":", 1)
+            client = QdrantClient(host=host, port=int(port), **options)
+            shards.append((client, settings.QDRANT_VIDEO_COLLECTION_NAME))
+        return shards
+
+    client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT, **options)
+    names = shard_collection_names(settings.QDRANT_VIDEO_COLLECTION_NAME, settings.QDRANT_SHARD_COUNT)
+    return [(client, name) for name in names]
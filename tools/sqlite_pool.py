@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+from config.settings import settings
+
+class SQLiteConnectionPool:
+    """Read-only SQLite connections, one per thread, reused across queries.
+
+    Connections are reopened when the database file is replaced (the builder
+    publishes new databases with an atomic rename), so a long-running process
+    never keeps serving a stale file. With SQLITE_IN_MEMORY the file is first
+    copied into a shared-cache in-memory database and connections read that.
+    """
+
+    def __init__(self, db_path, pragmas: Optional[Dict[str, Any]] = None,
+                 statement_cache_size: Optional[int] = None,
+                 in_memory: Optional[bool] = None):
+        self.db_path = Path(db_path)
+        self.pragmas = settings.SQLITE_PRAGMAS if pragmas is None else pragmas
+        self.statement_cache_size = statement_cache_size or settings.SQLITE_STATEMENT_CACHE_SIZE
+        self.in_memory = settings.SQLITE_IN_MEMORY if in_memory is None else in_memory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}  # thread id -> connection
+        self._metrics = {'checkouts': 0, 'connections_opened': 0, 'reconnects': 0}
+        self._replica = None  # (file identity, uri, anchor connection, size in bytes)
+
+        if self.in_memory and self.db_path.exists():
+            self._target_uri(self._file_identity())
+
+    def _file_identity(self):
+        stat = os.stat(self.db_path)
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _disk_uri(self) -> str:
+        return f"{self.db_path.resolve().as_uri()}?mode=ro"
+
+    def _load_replica(self, identity) -> Optional[tuple]:
+        """Copy the database file into a shared-cache in-memory database"""
+        size = os.path.getsize(self.db_path)
+        if size > settings.SQLITE_IN_MEMORY_MAX_BYTES:
+            print(f"SQLite replica skipped: {size / 2**20:.0f}MB exceeds "
+                  f"{settings.SQLITE_IN_MEMORY_MAX_BYTES / 2**20:.0f}MB, reading from disk")
+            return None
+
+        uri = f"file:replica_{identity[0]}_{identity[1]}?mode=memory&cache=shared"
+        # The anchor keeps the in-memory database alive while threads reconnect
+        anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        disk = sqlite3.connect(self._disk_uri(), uri=True)
+        try:
+            disk.backup(anchor)
+        finally:
+            disk.close()
+
+        page_count = anchor.execute("PRAGMA page_count").fetchone()[0]
+        page_size = anchor.execute("PRAGMA page_size").fetchone()[0]
+        replica_bytes = page_count * page_size
+        print(f"SQLite replica loaded into memory: {replica_bytes / 2**20:.1f}MB")
+        return (identity, uri, anchor, replica_bytes)
+
+    def _target_uri(self, identity) -> str:
+        """URI connections should open for the current database file"""
+        if not self.in_memory:
+            return self._disk_uri()
+
+        with self._lock:
+            if self._replica is None or self._replica[0] != identity:
+                old_replica = self._replica
+                self._replica = self._load_replica(identity) or (identity, None, None, 0)
+                if old_replica and old_replica[2] is not None:
+                    old_replica[2].close()  # freed once the last thread reconnects
+            uri = self._replica[1]
+
+        return uri or self._disk_uri()
+
+    def _open(self, uri: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size
+        )
+        conn.row_factory = sqlite3.Row  # Enable dict-like access
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Connection for the calling thread, opened on first use"""
+        identity = self._file_identity()
+        conn = getattr(self._local, 'conn', None)
+
+        if conn is None or self._local.identity != identity:
+            reconnect = conn is not None
+            if reconnect:
+                conn.close()
+            conn = self._open(self._target_uri(identity))
+            self._local.conn = conn
+            self._local.identity = identity
+            with self._lock:
+                self._metrics['connections_opened'] += 1
+                self._metrics['reconnects'] += int(reconnect)
+                self._connections[threading.get_ident()] = conn
+
+        with self._lock:
+            self._metrics['checkouts'] += 1
+        return conn
+
+    def stats(self) -> Dict:
+        """Pool usage metrics"""
+        with self._lock:
+            replica_bytes = self._replica[3] if self._replica else 0
+            return {
+                **self._metrics,
+                'open_connections': len(self._connections),
+                'in_memory': bool(replica_bytes),
+                'replica_bytes': replica_bytes
+            }
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+            if self._replica and self._replica[2] is not None:
+                self._replica[2].close()
+            self._replica = None
+        self._local = threading.local()
+
+_pools: Dict[str, SQLiteConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_connection_pool(db_path) -> SQLiteConnectionPool:
+    """Shared pool per database file, so every SQLiteTool reuses the same connections"""
+    key = str(Path(db_path).resolve())
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = SQLiteConnectionPool(db_path)
+        return _pools[key]
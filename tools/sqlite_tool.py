@@ -1,35 +1,176 @@
 import sqlite3
 import json
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, Optional, Tuple
 from config.settings import settings
+from utils.query_parser import QueryParser
+from .sqlite_pool import get_connection_pool
+from .query_stats import get_query_stats
 
 class SQLiteTool:
+    # Searchable video columns, in videos_fts column order (column 0 is video_id)
+    METADATA_FIELDS = ['title', 'description', 'keywords', 'author']
+    # Named frame regions as (xmin, ymin, xmax, ymax); boxes are normalized to [0, 1]
+    SPATIAL_REGIONS = {
+        'left': (0.0, 0.0, 0.5, 1.0),
+        'right': (0.5, 0.0, 1.0, 1.0),
+        'top': (0.0, 0.0, 1.0, 0.5),
+        'bottom': (0.0, 0.5, 1.0, 1.0),
+        'center': (0.25, 0.25, 0.75, 0.75)
+    }
+    # Orderings of the paginated search APIs: result columns, all descending.
+    # The last columns are unique tie-breakers, so they double as keyset cursors.
+    VIDEO_ORDERINGS = {
+        'relevance': ['rank_score', 'video_id'],
+        'date': ['publish_date', 'video_id'],
+        'length': ['length', 'video_id']
+    }
+    OBJECT_ORDERINGS = {
+        'confidence': ['avg_confidence', 'object_count', 'video_id', 'keyframe_id'],
+        'count': ['object_count', 'avg_confidence', 'video_id', 'keyframe_id']
+    }
+    DETECTION_ORDERINGS = {
+        'confidence': ['confidence', 'id'],
+        'area': ['area', 'id']
+    }
+    # Conditions between two boxes a and b in the same keyframe
+    SPATIAL_RELATIONS = {
+        'left_of': "a.xmax <= b.xmin",
+        'above': "a.ymax <= b.ymin",
+        'side_by_side': "a.xmax <= b.xmin AND a.ymin <= b.ymax AND a.ymax >= b.ymin",
+        'overlapping': "a.xmin <= b.xmax AND a.xmax >= b.xmin AND a.ymin <= b.ymax AND a.ymax >= b.ymin"
+    }
+    
     def __init__(self):
         self.db_path = settings.METADATA_KEYFRAME_OBJECT_DB_PATH
+        self.pool = get_connection_pool(self.db_path)
+        self.query_stats = get_query_stats() if settings.SQLITE_QUERY_STATS else None
     
     def execute_query(self, query: str, params: tuple = ()) -> List[Dict]:
         """Execute SQL query and return results as dict list"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row  # Enable dict-like access
-                cursor = conn.cursor()
-                cursor.execute(query, params)
-                
-                results = []
-                for row in cursor.fetchall():
-                    results.append(dict(row))
-                
-                return results
+            start_time = time.perf_counter()
+            conn = self.pool.connection()
+            cursor = conn.execute(query, params)
+            results = [dict(row) for row in cursor.fetchall()]
+            
+            if self.query_stats is not None:
+                elapsed_ms = (time.perf_counter() - start_time) * 1000
+                self.query_stats.record(query, params, elapsed_ms, len(results), conn)
+            return results
                 
-        except sqlite3.Error as e:
+        except (sqlite3.Error, OSError) as e:
             print(f"SQLite Error: {e}")
+            if self.query_stats is not None:
+                self.query_stats.record_error(query)
             return []
     
-    def search_videos_by_text(self, text: str, fields: List[str] = None) -> List[Dict]:
-        """Search videos by text in specified fields"""
-        if fields is None:
-            fields = ['title', 'description', 'keywords', 'author']
+    def get_pool_stats(self) -> Dict:
+        """Connection pool usage metrics"""
+        return self.pool.stats()
+    
+    def get_query_report(self) -> Dict:
+        """Per-template timings, row counts and slow queries with their plans"""
+        return self.query_stats.report() if self.query_stats is not None else {}
+    
+    def has_table(self, name: str) -> bool:
+        results = self.execute_query("SELECT 1 FROM sqlite_master WHERE name = ?", (name,))
+        return bool(results)
+    
+    def _ordering(self, orderings: Dict[str, List[str]], order_by: str) -> List[str]:
+        if order_by not in orderings:
+            raise ValueError(f"Unknown order_by '{order_by}', expected one of {list(orderings)}")
+        return orderings[order_by]
+    
+    def _paginate(self, query: str, params: list, order_columns: List[str],
+                  limit: Optional[int], offset: int, after: Optional[list]) -> Tuple[str, tuple]:
+        """Wrap query in a descending ORDER BY with keyset cursor and LIMIT/OFFSET.
+        
+        With a limit SQLite keeps only the top rows while sorting, so broad
+        matches are never materialized. after is the cursor of the last row
+        of the previous page (see next_cursor) and skips OFFSET's rescans.
+        """
+        paged = f"SELECT * FROM ({query}) AS page"
+        params = list(params)
+        if after is not None:
+            condition, cursor_params = self._keyset_condition(order_columns, after)
+            paged += f" WHERE {condition}"
+            params.extend(cursor_params)
+        paged += " ORDER BY " + ', '.join(f"{column} DESC" for column in order_columns)
+        if limit is not None or offset:
+            paged += " LIMIT ? OFFSET ?"
+            params.extend([-1 if limit is None else limit, offset])
+        return paged, tuple(params)
+    
+    @staticmethod
+    def _keyset_condition(order_columns: List[str], after: list) -> Tuple[str, list]:
+        """Rows after the cursor in descending order, where NULL sorts last as in ORDER BY ... DESC.
+        
+        A row-value comparison is NULL when either side has a NULL (e.g. a
+        video without publish_date), which would end paging early, so the
+        comparison is expanded column by column with IS for equality.
+        """
+        condition, params = None, []
+        for column, value in reversed(list(zip(order_columns, after))):
+            if value is None:
+                less, less_params = "0", []  # nothing sorts after NULL
+            else:
+                less, less_params = f"({column} < ? OR {column} IS NULL)", [value]
+            if condition is None:
+                condition, params = less, less_params
+            else:
+                condition = f"({less} OR ({column} IS ? AND {condition}))"
+                params = less_params + [value] + params
+        return condition, params
+    
+    @staticmethod
+    def next_cursor(results: List[Dict], order_columns: List[str]) -> Optional[list]:
+        """Keyset cursor for the page after results, or None when it was the last page"""
+        if not results:
+            return None
+        return [results[-1][column] for column in order_columns]
+    
+    def build_fts_query(self, text: str, fields: List[str], prefix: bool = False) -> Optional[str]:
+        """Turn free text into an FTS5 phrase query restricted to fields"""
+        folded = QueryParser.fold_diacritics(text).replace('*', ' ').strip()
+        if not folded:
+            return None
+        
+        phrase = '"' + folded.replace('"', '""') + '"'
+        if prefix:
+            phrase += ' *'
+        return f"{{{' '.join(fields)}}} : {phrase}"
+    
+    def search_videos_by_text(self, text: str, fields: List[str] = None, prefix: bool = False,
+                              limit: Optional[int] = None, offset: int = 0,
+                              order_by: str = 'relevance', after: Optional[list] = None) -> List[Dict]:
+        """Search videos by text in specified fields, best BM25 matches first"""
+        fields = [f for f in (fields or self.METADATA_FIELDS) if f in self.METADATA_FIELDS]
+        order_columns = self._ordering(self.VIDEO_ORDERINGS, order_by)
+        
+        if not self.has_table('videos_fts'):
+            query, params = self._search_videos_by_like(text, fields)
+            return self.execute_query(*self._paginate(query, params, order_columns, limit, offset, after))
+        
+        match_query = self.build_fts_query(text, fields, prefix)
+        if match_query is None:
+            return []
+        
+        weights = settings.METADATA_FTS_WEIGHTS
+        query = """
+        SELECT v.video_id, v.title, v.description, v.author, v.length, v.publish_date, v.keywords,
+               -bm25(videos_fts, 0, ?, ?, ?, ?) AS rank_score,
+               snippet(videos_fts, -1, '[', ']', '...', 12) AS snippet
+        FROM videos_fts
+        JOIN videos v ON v.video_id = videos_fts.video_id
+        WHERE videos_fts MATCH ?
+        """
         
+        params = [weights['title'], weights['description'], weights['keywords'], weights['author'], match_query]
+        return self.execute_query(*self._paginate(query, params, order_columns, limit, offset, after))
+    
+    def _search_videos_by_like(self, text: str, fields: List[str]) -> Tuple[str, list]:
+        """LIKE scan for databases built before the FTS5 index existed"""
         conditions = []
         params = []
         
@@ -38,27 +179,92 @@ class SQLiteTool:
             params.append(f"%{text.lower()}%")
         
         query = f"""
-        SELECT DISTINCT video_id, title, description, author, length, publish_date, keywords
-        FROM videos 
-        WHERE {' OR '.join(conditions)}
-        ORDER BY 
+        SELECT DISTINCT video_id, title, description, author, length, publish_date, keywords,
             CASE 
-                WHEN title LIKE ? THEN 1
+                WHEN title LIKE ? THEN 3
                 WHEN keywords LIKE ? THEN 2
-                WHEN description LIKE ? THEN 3
-                ELSE 4
-            END
+                WHEN description LIKE ? THEN 1
+                ELSE 0
+            END AS rank_score
+        FROM videos 
+        WHERE {' OR '.join(conditions)}
         """
         
-        # Add ranking parameters
+        # Ranking parameters come first in the statement
         ranking_params = [f"%{text.lower()}%"] * 3
-        all_params = params + ranking_params
+        return query, ranking_params + params
+    
+    def search_videos_by_terms(self, terms: List[str], fields: List[str] = None, prefix: bool = False,
+                               limit: Optional[int] = None, offset: int = 0,
+                               order_by: str = 'relevance', after: Optional[list] = None) -> List[Dict]:
+        """Search videos for many terms in one statement.
+        
+        Each video is returned once, with matched_terms, matched_fields and
+        rank_score summed over the terms it matched.
+        """
+        fields = [f for f in (fields or self.METADATA_FIELDS) if f in self.METADATA_FIELDS]
+        order_columns = self._ordering(self.VIDEO_ORDERINGS, order_by)
+        terms = list(dict.fromkeys(t for t in terms if t and t.strip()))
+        if not terms or not fields:
+            return []
+        
+        use_fts = self.has_table('videos_fts')
+        weights = settings.METADATA_FTS_WEIGHTS
         
-        return self.execute_query(query, tuple(all_params))
+        # One branch per term; each branch flags the fields the term was found in
+        branches = []
+        params = []
+        for term in terms:
+            if use_fts:
+                match_query = self.build_fts_query(term, fields, prefix)
+                if match_query is None:
+                    continue
+                field_flags = ', '.join(
+                    f"instr(highlight(videos_fts, {self.METADATA_FIELDS.index(f) + 1}, char(1), ''), char(1)) > 0 AS in_{f}"
+                    for f in fields
+                )
+                branches.append(f"""
+                SELECT video_id, ? AS term, -bm25(videos_fts, 0, ?, ?, ?, ?) AS score, {field_flags}
+                FROM videos_fts WHERE videos_fts MATCH ?
+                """)
+                params.extend([term, weights['title'], weights['description'], weights['keywords'],
+                               weights['author'], match_query])
+            else:
+                pattern = f"%{term.lower()}%"
+                field_flags = ', '.join(f"{f} LIKE ? AS in_{f}" for f in fields)
+                branches.append(f"""
+                SELECT video_id, ? AS term, 1.0 AS score, {field_flags}
+                FROM videos WHERE {' OR '.join(f'{f} LIKE ?' for f in fields)}
+                """)
+                params.extend([term] + [pattern] * (2 * len(fields)))
+        
+        if not branches:
+            return []
+        
+        query = f"""
+        WITH hits AS MATERIALIZED ({' UNION ALL '.join(branches)})
+        SELECT v.video_id, v.title, v.description, v.author, v.length, v.publish_date, v.keywords,
+               json_group_array(h.term) AS matched_terms,
+               {', '.join(f'MAX(h.in_{f}) AS in_{f}' for f in fields)},
+               SUM(h.score) AS rank_score
+        FROM hits h
+        JOIN videos v ON v.video_id = h.video_id
+        GROUP BY v.video_id
+        """
+        
+        results = self.execute_query(*self._paginate(query, params, order_columns, limit, offset, after))
+        for result in results:
+            result['matched_terms'] = json.loads(result['matched_terms'])
+            result['matched_fields'] = [f for f in fields if result.pop(f'in_{f}')]
+        
+        return results
     
     def search_objects(self, object_names: List[str], 
-                      confidence_threshold: float = 0.5) -> List[Dict]:
+                      confidence_threshold: float = 0.5, limit: Optional[int] = None,
+                      offset: int = 0, order_by: str = 'confidence',
+                      after: Optional[list] = None) -> List[Dict]:
         """Search keyframes containing specific objects"""
+        order_columns = self._ordering(self.OBJECT_ORDERINGS, order_by)
         placeholders = ','.join(['?' for _ in object_names])
         
         query = f"""
@@ -71,11 +277,169 @@ class SQLiteTool:
         WHERE o.object_name IN ({placeholders}) 
         AND o.confidence >= ?
         GROUP BY o.video_id, o.keyframe_id
-        ORDER BY avg_confidence DESC, object_count DESC
         """
         
-        params = tuple(object_names + [confidence_threshold])
-        return self.execute_query(query, params)
+        params = list(object_names) + [confidence_threshold]
+        return self.execute_query(*self._paginate(query, params, order_columns, limit, offset, after))
+    
+    def search_keyframes_by_counts(self, predicates: Dict[str, Any], limit: Optional[int] = None,
+                                   offset: int = 0, after: Optional[list] = None) -> List[Dict]:
+        """Keyframes whose per-class counts satisfy every QueryParser.parse_count_range spec; a missing class counts as 0"""
+        ranges = {name.lower(): QueryParser.parse_count_range(spec) for name, spec in predicates.items()}
+        if not ranges:
+            return []
+        
+        having = []
+        having_params = []
+        for name, (low, high) in ranges.items():
+            having.append("COALESCE(SUM(CASE WHEN c.object_name = ? THEN c.count END), 0) BETWEEN ? AND ?")
+            having_params.extend([name, low, high])
+        names_sql = ','.join(['?' for _ in ranges])
+        
+        if any(low > 0 for low, _ in ranges.values()):
+            # A required class bounds the candidates: aggregate its count rows first,
+            # so keyframes is only probed for the matching keyframes
+            query = f"""
+            SELECT h.video_id, h.keyframe_id, h.object_counts, k.pts_time, k.frame_idx
+            FROM (
+                SELECT c.video_id, c.keyframe_id, json_group_object(c.object_name, c.count) AS object_counts
+                FROM keyframe_object_counts c
+                WHERE c.object_name IN ({names_sql})
+                GROUP BY c.video_id, c.keyframe_id
+                HAVING {' AND '.join(having)}
+            ) h
+            JOIN keyframes k ON h.video_id = k.video_id AND h.keyframe_id = k.keyframe_id
+            """
+        else:
+            # Only zero/upper bounds: keyframes without any count row match too
+            query = f"""
+            SELECT k.video_id, k.keyframe_id,
+                   json_group_object(c.object_name, c.count) FILTER (WHERE c.object_name IS NOT NULL) AS object_counts,
+                   k.pts_time, k.frame_idx
+            FROM keyframes k
+            LEFT JOIN keyframe_object_counts c
+                ON c.video_id = k.video_id AND c.keyframe_id = k.keyframe_id AND c.object_name IN ({names_sql})
+            GROUP BY k.video_id, k.keyframe_id
+            HAVING {' AND '.join(having)}
+            """
+        params = list(ranges) + having_params
+        
+        order_columns = ['video_id', 'keyframe_id']
+        results = self.execute_query(*self._paginate(query, params, order_columns, limit, offset, after))
+        for result in results:
+            result['object_counts'] = json.loads(result['object_counts'] or '{}')
+        return results
+    
+    def _resolve_region(self, region) -> Optional[Tuple[float, float, float, float]]:
+        if region is None:
+            return None
+        if isinstance(region, str):
+            if region not in self.SPATIAL_REGIONS:
+                raise ValueError(f"Unknown region '{region}', expected one of {list(self.SPATIAL_REGIONS)}")
+            return self.SPATIAL_REGIONS[region]
+        return tuple(region)
+    
+    def search_objects_spatial(self, object_names: List[str] = None, inside=None, overlaps=None,
+                               min_area: float = None, confidence_threshold: float = 0.5,
+                               limit: Optional[int] = None, offset: int = 0,
+                               order_by: str = 'confidence', after: Optional[list] = None) -> List[Dict]:
+        """Search detections by class, position and size.
+        
+        inside/overlaps are an (xmin, ymin, xmax, ymax) box or a SPATIAL_REGIONS
+        name the detection must lie within / intersect; min_area is the smallest
+        box area as a fraction of the frame. Uses the objects_rtree R*Tree.
+        """
+        inside = self._resolve_region(inside)
+        overlaps = self._resolve_region(overlaps)
+        order_columns = self._ordering(self.DETECTION_ORDERINGS, order_by)
+        
+        if self.has_table('objects_rtree'):
+            source, box = "objects_rtree b JOIN objects o ON o.id = b.id", "b"
+            area = "b.area_max"
+        else:
+            # databases built before the R*Tree existed: same filter, no spatial index
+            source, box = "objects o", "o"
+            area = "(o.xmax - o.xmin) * (o.ymax - o.ymin)"
+        
+        conditions = ["o.confidence >= ?"]
+        params = [confidence_threshold]
+        
+        if inside:
+            conditions.append(f"{box}.xmin >= ? AND {box}.xmax <= ? AND {box}.ymin >= ? AND {box}.ymax <= ?")
+            params.extend([inside[0], inside[2], inside[1], inside[3]])
+        
+        if overlaps:
+            conditions.append(f"{box}.xmax >= ? AND {box}.xmin <= ? AND {box}.ymax >= ? AND {box}.ymin <= ?")
+            params.extend([overlaps[0], overlaps[2], overlaps[1], overlaps[3]])
+        
+        if min_area is not None:
+            conditions.append(f"{area} >= ?")
+            params.append(min_area)
+        
+        if object_names:
+            conditions.append(f"o.object_name IN ({','.join(['?' for _ in object_names])})")
+            params.extend(name.lower() for name in object_names)
+        
+        query = f"""
+        SELECT o.id, o.video_id, o.keyframe_id, o.object_name, o.confidence,
+               o.ymin, o.xmin, o.ymax, o.xmax,
+               (o.xmax - o.xmin) * (o.ymax - o.ymin) AS area,
+               k.pts_time, k.frame_idx
+        FROM {source}
+        JOIN keyframes k ON o.video_id = k.video_id AND o.keyframe_id = k.keyframe_id
+        WHERE {' AND '.join(conditions)}
+        """
+        
+        return self.execute_query(*self._paginate(query, params, order_columns, limit, offset, after))
+    
+    def search_objects_in_region(self, object_names: List[str], region, min_area: float = None,
+                                 confidence_threshold: float = 0.5, limit: Optional[int] = None,
+                                 offset: int = 0, after: Optional[list] = None) -> List[Dict]:
+        """Detections lying entirely within region, e.g. 'left'"""
+        return self.search_objects_spatial(object_names, inside=region, min_area=min_area,
+                                           confidence_threshold=confidence_threshold,
+                                           limit=limit, offset=offset, after=after)
+    
+    def search_objects_overlapping(self, object_names: List[str], region,
+                                   confidence_threshold: float = 0.5, limit: Optional[int] = None,
+                                   offset: int = 0, after: Optional[list] = None) -> List[Dict]:
+        """Detections intersecting region"""
+        return self.search_objects_spatial(object_names, overlaps=region,
+                                           confidence_threshold=confidence_threshold,
+                                           limit=limit, offset=offset, after=after)
+    
+    def search_objects_by_min_area(self, object_names: List[str], min_area: float,
+                                   confidence_threshold: float = 0.5, limit: Optional[int] = None,
+                                   offset: int = 0, after: Optional[list] = None) -> List[Dict]:
+        """Detections covering at least min_area of the frame, largest first"""
+        return self.search_objects_spatial(object_names, min_area=min_area,
+                                           confidence_threshold=confidence_threshold,
+                                           limit=limit, offset=offset, order_by='area', after=after)
+    
+    def search_object_pairs(self, first_object: str, second_object: str, relation: str = 'side_by_side',
+                            confidence_threshold: float = 0.5, limit: Optional[int] = None,
+                            offset: int = 0, after: Optional[list] = None) -> List[Dict]:
+        """Keyframes where a first_object box stands in relation to a second_object box"""
+        if relation not in self.SPATIAL_RELATIONS:
+            raise ValueError(f"Unknown relation '{relation}', expected one of {list(self.SPATIAL_RELATIONS)}")
+        
+        query = f"""
+        SELECT a.video_id, a.keyframe_id,
+               a.id AS first_id, a.confidence AS first_confidence,
+               b.id AS second_id, b.confidence AS second_confidence,
+               a.confidence + b.confidence AS pair_score,
+               k.pts_time, k.frame_idx
+        FROM objects a
+        JOIN objects b ON b.video_id = a.video_id AND b.keyframe_id = a.keyframe_id AND b.id != a.id
+        JOIN keyframes k ON a.video_id = k.video_id AND a.keyframe_id = k.keyframe_id
+        WHERE a.object_name = ? AND a.confidence >= ?
+        AND b.object_name = ? AND b.confidence >= ?
+        AND {self.SPATIAL_RELATIONS[relation]}
+        """
+        
+        params = [first_object.lower(), confidence_threshold, second_object.lower(), confidence_threshold]
+        order_columns = ['pair_score', 'first_id', 'second_id']
+        return self.execute_query(*self._paginate(query, params, order_columns, limit, offset, after))
     
     def get_keyframes_in_timerange(self, video_id: str, 
                                   start_time: float, end_time: float) -> List[Dict]:
@@ -105,4 +469,52 @@ class SQLiteTool:
         ORDER BY confidence DESC
         """
         
-        return self.execute_query(query, (video_id, keyframe_id))
\ No newline at end of file
+        return self.execute_query(query, (video_id, keyframe_id))
+    
+    def get_videos_metadata(self, video_ids: List[str]) -> Dict[str, Dict]:
+        """Get full metadata for many videos in one query, keyed by video_id"""
+        unique_ids = list(dict.fromkeys(video_ids))
+        if not unique_ids:
+            return {}
+        
+        # One JSON parameter instead of one placeholder per id
+        query = "SELECT * FROM videos WHERE video_id IN (SELECT value FROM json_each(?))"
+        results = self.execute_query(query, (json.dumps(unique_ids),))
+        return {row['video_id']: row for row in results}
+    
+    def get_keyframes(self, keyframes: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict]:
+        """Get many keyframe rows in one query, keyed by (video_id, keyframe_id)"""
+        if not keyframes:
+            return {}
+        
+        query = """
+        SELECT * FROM keyframes
+        WHERE (video_id, keyframe_id) IN (
+            SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)
+        )
+        """
+        
+        results = self.execute_query(query, (json.dumps([list(k) for k in keyframes]),))
+        return {(row['video_id'], row['keyframe_id']): row for row in results}
+    
+    def get_objects_for_keyframes(self, keyframes: List[Tuple[str, str]]) -> Dict[Tuple[str, str], List[Dict]]:
+        """Get the objects of many keyframes in one query, keyed by (video_id, keyframe_id)"""
+        grouped = {tuple(keyframe): [] for keyframe in keyframes}
+        if not grouped:
+            return {}
+        
+        query = """
+        SELECT video_id, keyframe_id, object_name, confidence, ymin, xmin, ymax, xmax
+        FROM objects
+        WHERE (video_id, keyframe_id) IN (
+            SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)
+        )
+        ORDER BY video_id, keyframe_id, confidence DESC
+        """
+        
+        results = self.execute_query(query, (json.dumps(list(grouped)),))
+        for row in results:
+            key = (row.pop('video_id'), row.pop('keyframe_id'))
+            grouped[key].append(row)
+        
+        return grouped
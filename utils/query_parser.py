@@ -1,4 +1,5 @@
 import re
+import unicodedata
 from typing import Dict, List, Tuple
 
 class QueryParser:
@@ -47,4 +48,55 @@ class QueryParser:
             if color in query_lower:
                 found_colors.append(color)
         
-        return found_colors
\ No newline at end of file
+        return found_colors
+    
+    @staticmethod
+    def fold_diacritics(text: str) -> str:
+        """Lowercase and strip Vietnamese diacritics ("Đồ ăn" -> "do an")"""
+        # đ is a separate letter, not a combining mark, so NFD alone would keep it
+        text = text.lower().replace('đ', 'd')
+        decomposed = unicodedata.normalize('NFD', text)
+        return ''.join(c for c in decomposed if unicodedata.category(c) != 'Mn')
+    
+    @staticmethod
+    def parse_count_range(spec) -> Tuple[int, int]:
+        """Turn a count predicate into an inclusive (min, max) range.
+        
+        Accepts 3, 3.0, "3", ">=2", ">2", "<=4", "<4", "2-4", [2, 4] or {"min": 2, "max": 4};
+        a missing bound is open (0 or 255).
+        """
+        def as_count(value):
+            # 3.0 (e.g. from JSON) is a count, 2.5 is not
+            if value is None:
+                return None
+            number = float(value)
+            if not number.is_integer() or number < 0:
+                raise ValueError(f"Invalid count predicate: {spec!r}")
+            return int(number)
+        
+        if isinstance(spec, dict):
+            low, high = as_count(spec.get('min')), as_count(spec.get('max'))
+        elif isinstance(spec, (list, tuple)):
+            low, high = (as_count(value) for value in spec)
+        elif isinstance(spec, (int, float)):
+            low = high = as_count(spec)
+        else:
+            text = str(spec).replace(' ', '')
+            match = re.fullmatch(r'(>=|<=|>|<|=)?(\d+)(?:\.0+)?(?:-(\d+)(?:\.0+)?)?', text)
+            if not match:
+                raise ValueError(f"Invalid count predicate: {spec!r}")
+            op, value, upper = match.group(1), int(match.group(2)), match.group(3)
+            if upper is not None:
+                low, high = value, int(upper)
+            elif op == '>=':
+                low, high = value, None
+            elif op == '>':
+                low, high = value + 1, None
+            elif op == '<=':
+                low, high = None, value
+            elif op == '<':
+                low, high = None, value - 1
+            else:
+                low = high = value
+        
+        return (0 if low is None else int(low), 255 if high is None else int(high))